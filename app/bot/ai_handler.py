@@ -5,7 +5,7 @@ Supports MCP (Model Context Protocol) servers and database queries
 import logging
 import json
 from typing import List, Dict, Optional, Any
-from openai import OpenAI
+from openai import AsyncOpenAI
 
 from app.config import get_settings
 from app.db import business_data
@@ -34,7 +34,7 @@ class AIHandler:
         
         # Use OpenAI SDK but point to Groq's OpenAI-compatible API
         try:
-            self.client = OpenAI(
+            self.client = AsyncOpenAI(
                 api_key=settings.groq_api_key,
                 base_url="https://api.groq.com/openai/v1"  # Groq's OpenAI-compatible endpoint
             )
@@ -279,7 +279,7 @@ Responde en español de manera natural y profesional."""
             logger.info(f"Calling Groq API with model: {self.model}, messages: {len(api_params['messages'])}")
             
             try:
-                response = self.client.chat.completions.create(**api_params)
+                response = await self.client.chat.completions.create(**api_params)
             except Exception as api_error:
                 logger.error(f"Groq API call failed: {type(api_error).__name__}: {api_error}")
                 # Check for specific error types
@@ -339,7 +339,7 @@ Responde en español de manera natural y profesional."""
                 ]
                 
                 # Get final response with tool results
-                final_response = self.client.chat.completions.create(
+                final_response = await self.client.chat.completions.create(
                     model=self.model,
                     messages=messages_with_tools,
                     max_tokens=500,
@@ -1,9 +1,12 @@
 """
 Shared utilities to build business context snippets from the database.
 """
+import asyncio
 import logging
+import time
 from datetime import date, datetime
-from typing import Optional, List, Dict, Any
+from itertools import islice
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, List, Optional, Tuple
 
 from app.config import get_settings
 from app.db import business_data
@@ -12,6 +15,68 @@ logger = logging.getLogger(__name__)
 
 settings = get_settings()
 
+# View restrictions come from env config and never change while the process runs
+_ENABLED_VIEWS = tuple(settings.get_enabled_views())
+
+# The sales dashboard date range only moves when new data is ingested
+_DATE_RANGE_TTL_SECONDS = 600.0
+_date_range_cache: Tuple[float, Tuple[Optional[date], Optional[date]]] = (0.0, (None, None))
+
+# Intent keywords are matched as substrings of the lowercased message
+_SALES_KEYWORDS = (
+    "ventas",
+    "venta",
+    "ingresos",
+    "revenue",
+    "facturación",
+    "facturacion",
+    "mes",
+    "meses",
+    "día",
+    "dia",
+    "semana",
+    "costos",
+    "gastos",
+)
+_MARKETING_KEYWORDS = (
+    "marketing",
+    "anuncios",
+    "anuncio",
+    "publicidad",
+    "ads",
+    "campaña",
+    "campana",
+    "roi",
+)
+_PRODUCTS_KEYWORDS = (
+    "productos más vendidos",
+    "top productos",
+    "productos vendidos",
+    "productos populares",
+    "productos",
+)
+_FINANCIAL_KEYWORDS = (
+    "financiero",
+    "financieros",
+    "gastos",
+    "costos",
+    "margen",
+    "ganancia",
+    "utilidad",
+)
+_GENERAL_KEYWORDS = (
+    "reporte",
+    "reportes",
+    "análisis",
+    "analisis",
+    "métricas",
+    "metricas",
+    "estadísticas",
+    "estadisticas",
+    "dashboard",
+)
+_ORDERS_KEYWORDS = ("pedido", "orden", "compra")
+
 
 async def build_business_context(message: Optional[str], phone_number: Optional[str] = None) -> Optional[str]:
     """
@@ -28,109 +93,24 @@ async def build_business_context(message: Optional[str], phone_number: Optional[
         return None
 
     message_lower = message.lower()
-    context_parts: List[str] = []
+    stripped = message_lower.strip()
 
     try:
-        # Sales / revenue / financial words (including numeric shortcuts)
-        if any(
-            word in message_lower
-            for word in [
-                "ventas",
-                "venta",
-                "ingresos",
-                "revenue",
-                "facturación",
-                "facturacion",
-                "mes",
-                "meses",
-                "día",
-                "dia",
-                "semana",
-                "costos",
-                "gastos",
-            ]
-        ) or message_lower.strip() in ["1", "uno"]:
-            context_parts.append(await _build_sales_context())
-
-        # Marketing intent
-        if (
-            any(
-                word in message_lower
-                for word in [
-                    "marketing",
-                    "anuncios",
-                    "anuncio",
-                    "publicidad",
-                    "ads",
-                    "campaña",
-                    "campana",
-                    "roi",
-                ]
-            )
-            or message_lower.strip() in ["2", "dos"]
-        ):
-            context_parts.append(await _build_marketing_context())
-
-        # Product analytics
-        if (
-            any(
-                word in message_lower
-                for word in [
-                    "productos más vendidos",
-                    "top productos",
-                    "productos vendidos",
-                    "productos populares",
-                    "productos",
-                ]
-            )
-            or message_lower.strip() in ["4", "cuatro"]
-        ):
-            context_parts.append(await _build_products_context())
-
-        # Financial metrics
-        if (
-            any(
-                word in message_lower
-                for word in [
-                    "financiero",
-                    "financieros",
-                    "gastos",
-                    "costos",
-                    "margen",
-                    "ganancia",
-                    "utilidad",
-                ]
-            )
-            or message_lower.strip() in ["5", "cinco"]
-        ):
-            context_parts.append(await _build_financial_context())
-
-        # General analytics / dashboard intent
-        if (
-            any(
-                word in message_lower
-                for word in [
-                    "reporte",
-                    "reportes",
-                    "análisis",
-                    "analisis",
-                    "métricas",
-                    "metricas",
-                    "estadísticas",
-                    "estadisticas",
-                    "dashboard",
-                ]
-            )
-            or message_lower.strip() in ["6", "seis"]
-        ):
-            context_parts.append(await _build_general_context())
+        coros = [
+            builder()
+            for keywords, shortcuts, builder in _INTENT_DISPATCH
+            if stripped in shortcuts or any(word in message_lower for word in keywords)
+        ]
 
         # Orders by phone (if phone provided)
-        if phone_number and any(word in message_lower for word in ["pedido", "orden", "compra"]):
-            context_parts.append(await _build_orders_context(phone_number))
+        if phone_number and any(word in message_lower for word in _ORDERS_KEYWORDS):
+            coros.append(_build_orders_context(phone_number))
 
         # Clean empty sections
-        context_parts = [part for part in context_parts if part]
+        context_parts: List[str] = [part for part in await asyncio.gather(*coros) if part]
+        # Off-topic messages (greetings, acknowledgements) need no DB summary
+        if not context_parts:
+            return None
         access_summary = await _build_db_access_summary()
         if access_summary:
             context_parts.append(access_summary)
@@ -251,13 +231,23 @@ async def _build_orders_context(phone_number: str) -> str:
         return f"❌ Error consultando pedidos para {phone_number}: {exc}"
 
 
+# (keywords, numeric menu shortcuts, builder) evaluated in menu order
+_INTENT_DISPATCH: Tuple[Tuple[Tuple[str, ...], FrozenSet[str], Callable[[], Awaitable[str]]], ...] = (
+    (_SALES_KEYWORDS, frozenset({"1", "uno"}), _build_sales_context),
+    (_MARKETING_KEYWORDS, frozenset({"2", "dos"}), _build_marketing_context),
+    (_PRODUCTS_KEYWORDS, frozenset({"4", "cuatro"}), _build_products_context),
+    (_FINANCIAL_KEYWORDS, frozenset({"5", "cinco"}), _build_financial_context),
+    (_GENERAL_KEYWORDS, frozenset({"6", "seis"}), _build_general_context),
+)
+
+
 def _format_records(header: str, records: List[Dict]) -> str:
-    lines = [header]
-    for record in records[:10]:
-        record_info = ", ".join(
-            [f"{k}: {v}" for k, v in record.items() if v is not None][:5]
-        )
-        lines.append(f"- {record_info}")
+    subset = records[:10]
+    lines: List[Optional[str]] = [None] * (len(subset) + 1)
+    lines[0] = header
+    for idx, record in enumerate(subset, start=1):
+        fields = islice(((k, v) for k, v in record.items() if v is not None), 5)
+        lines[idx] = "- " + ", ".join(k + ": " + str(v) for k, v in fields)
     return "\n".join(lines)
 
 
@@ -380,12 +370,26 @@ def _parse_month_value(value: Any) -> Optional[date]:
     return None
 
 
+async def _cached_date_range() -> Tuple[Optional[date], Optional[date]]:
+    global _date_range_cache
+
+    now = time.monotonic()
+    cached_at, value = _date_range_cache
+    if cached_at and now - cached_at < _DATE_RANGE_TTL_SECONDS:
+        return value
+
+    value = await business_data.get_sales_dashboard_date_range()
+    # Only keep real results so a transient DB error is retried on the next message
+    if any(value):
+        _date_range_cache = (now, value)
+    return value
+
+
 async def _build_db_access_summary() -> Optional[str]:
-    earliest, latest = await business_data.get_sales_dashboard_date_range()
+    earliest, latest = await _cached_date_range()
     lines: List[str] = []
-    enabled_views = settings.get_enabled_views()
-    if enabled_views:
-        lines.append(f"Vistas habilitadas: {', '.join(enabled_views)}.")
+    if _ENABLED_VIEWS:
+        lines.append(f"Vistas habilitadas: {', '.join(_ENABLED_VIEWS)}.")
     else:
         lines.append("El bot puede consultar todas las vistas que tus credenciales permiten.")
 
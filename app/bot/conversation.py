@@ -1,20 +1,72 @@
 """
 Conversation manager - handles message flow and context
 """
+import asyncio
+import json
 import logging
-from typing import Dict, Optional
-from datetime import datetime
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Dict, Optional
+from datetime import datetime, timezone
 
 from app.bot.ai_handler import AIHandler
 from app.bot.faq import FAQHandler
 from app.bot import marketing_analysis
 from app.bot.demo_script import DemoScriptHandler
+from app.bot.response_cache import ResponseCache
+from app.bot.conversation_state import ConversationContext, ConversationMetadata
 from app.db.leads import get_or_create_lead, get_conversation_history
 from app.config import get_settings
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+try:
+    from redis import asyncio as redis_asyncio
+    REDIS_AVAILABLE = True
+except ImportError:
+    redis_asyncio = None
+    REDIS_AVAILABLE = False
+
+REDIS_KEY_PREFIX = "conversation:"
+
+# Map numbers to FAQ responses (matching welcome message order)
+NUMBER_COMMAND_MAP = {
+    '1': 'ventas', 'uno': 'ventas',
+    '2': 'gastos', 'dos': 'gastos',  # Ingresos y gastos
+    '3': 'marketing', 'tres': 'marketing',  # Marketing y anuncios
+    '4': 'productos más vendidos', 'cuatro': 'productos más vendidos',
+    '5': 'reporte', 'cinco': 'reporte',  # Análisis de clientes (usar reporte general)
+    '6': 'reporte', 'seis': 'reporte'  # Reporte general
+}
+NUMBER_COMMANDS = frozenset(NUMBER_COMMAND_MAP)
+
+# Numeric answers to the marketing scope prompt
+MARKETING_SCOPE_NUMBER_MAP = {
+    '1': 'campaigns',
+    'uno': 'campaigns',
+    '2': 'adsets',
+    'dos': 'adsets',
+    '3': 'ads',
+    'tres': 'ads',
+}
+
+# Sliding window of messages stored per conversation (AIHandler only sends the last 10)
+MAX_HISTORY_MESSAGES = 40
+
+
+@dataclass
+class MessageTurn:
+    """State shared by the reply handlers while processing one message"""
+    phone_number: str
+    contact_name: str
+    message_text: str
+    message_lower: str
+    is_first: bool
+    conversation: ConversationContext
+    metadata: ConversationMetadata
+
 
 class ConversationManager:
     """Manages conversations with users"""
@@ -23,8 +75,51 @@ class ConversationManager:
         self.ai_handler = AIHandler()
         self.faq_handler = FAQHandler()
         self.demo_script_handler = DemoScriptHandler()
-        # In-memory conversation storage (use Redis or DB in production)
-        self.conversations: Dict[str, dict] = {}
+        # In-memory LRU of active conversations, mirrored to Redis when REDIS_URL is set
+        self.conversations: "OrderedDict[str, ConversationContext]" = OrderedDict()
+        self._last_access: Dict[str, float] = {}
+        # Use custom welcome message if provided, otherwise use default
+        self.welcome_message = settings.welcome_message or f"""📊 ¡Hola! Soy {settings.bot_name}, tu asistente analítico 📈
+
+Estoy aquí para ayudarte a analizar el rendimiento de {settings.business_name}:
+
+**Opciones disponibles:**
+1️⃣ 📈 Ventas del mes
+2️⃣ 💰 Ingresos y gastos
+3️⃣ 📱 Marketing y anuncios
+4️⃣ 📦 Productos más vendidos
+5️⃣ 👥 Análisis de clientes
+6️⃣ 📊 Reporte general
+
+Simplemente escribe el número (1, 2, 3...) o pregunta directamente.
+
+¿Qué te gustaría revisar hoy?"""
+        self.redis = None
+        # Redis writes are queued and flushed by a single background consumer
+        self._write_queue: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        # Caps concurrent history/lead loads so bursts can't exhaust the DB pool
+        self._db_semaphore = asyncio.Semaphore(settings.db_max_concurrency)
+        if settings.redis_url:
+            if REDIS_AVAILABLE:
+                self.redis = redis_asyncio.from_url(settings.redis_url)
+                logger.info("Redis conversation store enabled")
+            else:
+                logger.warning("REDIS_URL is set but the redis package is not installed - using in-memory conversations only")
+        # Optional cache of AI answers to repeated questions (disabled when TTL is 0)
+        self.response_cache = None
+        if settings.response_cache_ttl > 0:
+            self.response_cache = ResponseCache(settings.response_cache_ttl, self.redis)
+        # Reply handlers in priority order; each returns None to pass the turn on
+        self._handlers = (
+            self._handle_demo_script,
+            self._handle_welcome,
+            self._handle_marketing_scope,
+            self._handle_number_command,
+            self._handle_faq,
+            self._handle_cached_ai,
+            self._handle_ai,
+        )
     
     async def process_message(
         self,
@@ -49,135 +144,59 @@ class ConversationManager:
             # Get or create conversation context (loads history from DB)
             conversation = await self.get_conversation(from_number, contact_name)
             
-            logger.info(f"Processing message from {contact_name}: {message_text}")
+            logger.info("Processing message from %s: %s", contact_name, message_text)
             
             # Check if it's the first message - send welcome message
             # Check BEFORE adding the message to history
             is_first = self._is_first_message(conversation)
-            is_greeting = self._is_greeting_message(message_text)
             
             # Add message to history
-            conversation["messages"].append({
+            conversation.messages.append({
                 "role": "user",
                 "content": message_text,
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": datetime.now(timezone.utc).isoformat(),
                 "message_id": message_id
             })
-            metadata = conversation.setdefault("metadata", {})
-            metadata.setdefault("awaiting_marketing_scope", False)
-            message_lower = message_text.lower().strip()
-            scope_choice = self._interpret_marketing_scope(message_text)
+            metadata = conversation.metadata
+            metadata.user_msg_count += 1
 
-            response = None
-            scripted_response = self.demo_script_handler.get_response(message_text, conversation)
-            if scripted_response:
-                response = scripted_response
-            
-            # Always show welcome message on first interaction, regardless of greeting
-            if response is None and is_first:
-                logger.info("First message with greeting - sending welcome message")
-                # Use custom welcome message if provided, otherwise use default
-                if settings.welcome_message:
-                    response = settings.welcome_message
-                else:
-                    response = f"""📊 ¡Hola! Soy {settings.bot_name}, tu asistente analítico 📈
-
-Estoy aquí para ayudarte a analizar el rendimiento de {settings.business_name}:
-
-**Opciones disponibles:**
-1️⃣ 📈 Ventas del mes
-2️⃣ 💰 Ingresos y gastos
-3️⃣ 📱 Marketing y anuncios
-4️⃣ 📦 Productos más vendidos
-5️⃣ 👥 Análisis de clientes
-6️⃣ 📊 Reporte general
-
-Simplemente escribe el número (1, 2, 3...) o pregunta directamente.
+            turn = MessageTurn(
+                phone_number=from_number,
+                contact_name=contact_name,
+                message_text=message_text,
+                message_lower=message_text.lower().strip(),
+                is_first=is_first,
+                conversation=conversation,
+                metadata=metadata,
+            )
 
-¿Qué te gustaría revisar hoy?"""
-            elif response is None and metadata.get("awaiting_marketing_scope"):
-                if scope_choice:
-                    metadata["awaiting_marketing_scope"] = False
-                    response = await self.ai_handler.generate_marketing_performance_report(scope_choice)
-                else:
-                    metadata["awaiting_marketing_scope"] = False
-                    response = await self.ai_handler.generate_response(
-                        message_text=message_text,
-                        conversation_history=conversation["messages"],
-                        contact_name=contact_name,
-                        phone_number=from_number
-                    )
-            # Check if it's a number command (1-6)
-            elif response is None and message_lower in ['1', '2', '3', '4', '5', '6', 'uno', 'dos', 'tres', 'cuatro', 'cinco', 'seis']:
-                logger.info(f"Detected number command: {message_text}")
-                # Map numbers to FAQ responses (matching welcome message order)
-                number_map = {
-                    '1': 'ventas', 'uno': 'ventas',
-                    '2': 'gastos', 'dos': 'gastos',  # Ingresos y gastos
-                    '3': 'marketing', 'tres': 'marketing',  # Marketing y anuncios
-                    '4': 'productos más vendidos', 'cuatro': 'productos más vendidos',
-                    '5': 'reporte', 'cinco': 'reporte',  # Análisis de clientes (usar reporte general)
-                    '6': 'reporte', 'seis': 'reporte'  # Reporte general
-                }
-                mapped_command = number_map.get(message_lower)
-                if mapped_command:
-                    if mapped_command == 'marketing':
-                        metadata["awaiting_marketing_scope"] = True
-                        response = self._marketing_scope_prompt()
-                    else:
-                        # Always use AI to get actual data, not just FAQ menu
-                        response = await self.ai_handler.generate_response(
-                            message_text=mapped_command,
-                            conversation_history=conversation["messages"],
-                            contact_name=contact_name,
-                            phone_number=from_number
-                        )
-                else:
-                    response = await self.ai_handler.generate_response(
-                        message_text=message_text,
-                        conversation_history=conversation["messages"],
-                        contact_name=contact_name,
-                        phone_number=from_number
-                    )
-            # Check if it's a FAQ question (but only during the first turn)
-            elif response is None and is_first and (faq_response := self.faq_handler.get_response(message_text)):
-                logger.info("Responding with FAQ answer")
-                # If FAQ response says "Consultando la base de datos...", use AI to actually get data
-                if "Consultando la base de datos" in faq_response:
-                    # Use AI to get actual data
-                    response = await self.ai_handler.generate_response(
-                        message_text=message_text,
-                        conversation_history=conversation["messages"],
-                        contact_name=contact_name,
-                        phone_number=from_number
-                    )
-                else:
-                    response = faq_response
-            
-            # Use AI for general conversation
-            if response is None:
-                logger.info("Using AI handler for response")
-                response = await self.ai_handler.generate_response(
-                    message_text=message_text,
-                    conversation_history=conversation["messages"],
-                    contact_name=contact_name,
-                    phone_number=from_number
-                )
+            # First handler that produces a reply wins
+            response = None
+            for handler in self._handlers:
+                response = await handler(turn)
+                if response is not None:
+                    break
             
             # Add response to history
-            conversation["messages"].append({
+            replied_at = datetime.now(timezone.utc).isoformat()
+            conversation.messages.append({
                 "role": "assistant",
                 "content": response,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": replied_at
             })
             
+            # Keep only the recent window so stored history stays bounded
+            if len(conversation.messages) > MAX_HISTORY_MESSAGES:
+                del conversation.messages[:-MAX_HISTORY_MESSAGES]
+            
             # Update last interaction
-            conversation["last_interaction"] = datetime.now().isoformat()
+            conversation.last_interaction = replied_at
+            self._schedule_persist(from_number, conversation)
             
             return response
             
         except Exception as e:
-            logger.error(f"Error processing message: {e}")
+            logger.error("Error processing message: %s", e)
             import traceback
             traceback.print_exc()
             return """⚠️ **Error procesando tu mensaje**
@@ -191,84 +210,209 @@ Disculpa, tuve un problema técnico.
 
 ¿Puedes intentar de nuevo?"""
     
-    async def get_conversation(self, phone_number: str, contact_name: str) -> dict:
+    async def _generate_ai_response(self, turn: "MessageTurn", message_text: Optional[str] = None) -> Optional[str]:
+        return await self.ai_handler.generate_response(
+            message_text=message_text or turn.message_text,
+            conversation_history=turn.conversation.messages,
+            contact_name=turn.contact_name,
+            phone_number=turn.phone_number
+        )
+    
+    async def _handle_demo_script(self, turn: "MessageTurn") -> Optional[str]:
+        return self.demo_script_handler.get_response(turn.message_text, turn.conversation)
+    
+    async def _handle_welcome(self, turn: "MessageTurn") -> Optional[str]:
+        # Always show welcome message on first interaction, regardless of greeting
+        if not turn.is_first:
+            return None
+        logger.info("First message with greeting - sending welcome message")
+        return self.welcome_message
+    
+    async def _handle_marketing_scope(self, turn: "MessageTurn") -> Optional[str]:
+        if not turn.metadata.awaiting_marketing_scope:
+            return None
+        turn.metadata.awaiting_marketing_scope = False
+        scope_choice = self._interpret_marketing_scope(turn.message_text)
+        if scope_choice:
+            return await self.ai_handler.generate_marketing_performance_report(scope_choice)
+        return await self._generate_ai_response(turn)
+    
+    async def _handle_number_command(self, turn: "MessageTurn") -> Optional[str]:
+        # Check if it's a number command (1-6)
+        if turn.message_lower not in NUMBER_COMMANDS:
+            return None
+        logger.info("Detected number command: %s", turn.message_text)
+        mapped_command = NUMBER_COMMAND_MAP[turn.message_lower]
+        if mapped_command == 'marketing':
+            turn.metadata.awaiting_marketing_scope = True
+            return self._marketing_scope_prompt()
+        # Always use AI to get actual data, not just FAQ menu
+        return await self._generate_ai_response(turn, mapped_command)
+    
+    async def _handle_faq(self, turn: "MessageTurn") -> Optional[str]:
+        # Check if it's a FAQ question (but only during the first turn)
+        if not turn.is_first:
+            return None
+        faq_response = self.faq_handler.get_response(turn.message_text)
+        if not faq_response:
+            return None
+        logger.info("Responding with FAQ answer")
+        # If FAQ response says "Consultando la base de datos...", use AI to actually get data
+        if "Consultando la base de datos" in faq_response:
+            return await self._generate_ai_response(turn)
+        return faq_response
+    
+    async def _handle_cached_ai(self, turn: "MessageTurn") -> Optional[str]:
+        if not self.response_cache:
+            return None
+        response = await self.response_cache.get(turn.phone_number, turn.message_text)
+        if response is not None:
+            logger.info("Responding with cached AI answer")
+        return response
+    
+    async def _handle_ai(self, turn: "MessageTurn") -> Optional[str]:
+        # Use AI for general conversation
+        logger.info("Using AI handler for response")
+        response = await self._generate_ai_response(turn)
+        # Error messages from the AI handler are never cached
+        if self.response_cache and response and not response.startswith("⚠️"):
+            await self.response_cache.set(turn.phone_number, turn.message_text, response)
+        return response
+    
+    async def get_conversation(self, phone_number: str, contact_name: str) -> ConversationContext:
         """
         Get or create conversation context, loading history from database if available
         """
-        # Check if already in memory
+        # Check if already in memory, then in the shared Redis store
         if phone_number not in self.conversations:
-            # Load lead info and conversation history from database
-            lead = await get_or_create_lead(phone_number, contact_name)
-            history = await get_conversation_history(phone_number, limit=50)
+            cached = await self._load_cached_conversation(phone_number)
+            if cached:
+                self.conversations[phone_number] = cached
+        
+        if phone_number not in self.conversations:
+            # Load lead info and conversation history from database concurrently
+            lead, history = await asyncio.gather(
+                self._run_db_call(get_or_create_lead(phone_number, contact_name)),
+                self._run_db_call(get_conversation_history(phone_number, limit=50)),
+                return_exceptions=True,
+            )
+            if isinstance(lead, Exception):
+                logger.warning("Could not load lead for %s: %s", phone_number, lead)
+                lead = None
+            if isinstance(history, Exception):
+                logger.warning("Could not load history for %s: %s", phone_number, history)
+                history = []
             
-            self.conversations[phone_number] = {
-                "phone": phone_number,
-                "name": contact_name,
-                "messages": history if history else [],
-                "created_at": datetime.now().isoformat(),
-                "last_interaction": datetime.now().isoformat(),
-                "metadata": {
-                    "lead_status": lead.get("lead_status") if lead else "unknown",
-                    "lead_id": lead.get("id") if lead else None,
-                    "awaiting_marketing_scope": False
-                }
-            }
+            loaded_at = datetime.now(timezone.utc).isoformat()
+            self.conversations[phone_number] = ConversationContext(
+                phone=phone_number,
+                name=contact_name,
+                messages=history if history else [],
+                created_at=loaded_at,
+                last_interaction=loaded_at,
+                metadata=ConversationMetadata(
+                    lead_status=lead.get("lead_status") if lead else "unknown",
+                    lead_id=lead.get("id") if lead else None,
+                    user_msg_count=self._count_user_messages(history or []),
+                ),
+            )
             
             if history:
-                logger.info(f"Loaded {len(history)} messages from history for {phone_number}")
+                logger.info("Loaded %d messages from history for %s", len(history), phone_number)
         
+        conversation = self.conversations[phone_number]
         # Update name if different
-        if contact_name and self.conversations[phone_number]["name"] != contact_name:
-            self.conversations[phone_number]["name"] = contact_name
-        metadata = self.conversations[phone_number].setdefault("metadata", {})
-        metadata.setdefault("awaiting_marketing_scope", False)
+        if contact_name and conversation.name != contact_name:
+            conversation.name = contact_name
+        self._touch(phone_number)
         
-        return self.conversations[phone_number]
+        return conversation
     
-    def _is_greeting_message(self, message: str) -> bool:
-        """
-        Check if message is a greeting or first contact
-        
-        Args:
-            message: User message
-        
-        Returns:
-            True if message is a greeting
-        """
-        message_lower = message.lower().strip()
-        greetings = [
-            "hola", "hi", "hey", "hello", "buenos días", "buenas tardes", 
-            "buenas noches", "buen día", "saludos", "qué tal", "que tal",
-            "ahoy", "buen día", "día", "hey", "hi", "buenas"
-        ]
-        
-        # Check if message is just a greeting
-        if message_lower in greetings:
-            return True
-        
-        # Check if message starts with a greeting
-        for greeting in greetings:
-            if message_lower.startswith(greeting):
-                return True
+    async def _run_db_call(self, coro: Awaitable[Any]) -> Any:
+        async with self._db_semaphore:
+            return await coro
+    
+    def _touch(self, phone_number: str) -> None:
+        """Mark a conversation as recently used and evict stale ones"""
+        now = time.monotonic()
+        self.conversations.move_to_end(phone_number)
+        self._last_access[phone_number] = now
         
-        return False
+        # Evicted conversations are already persisted in the database (and
+        # Redis when enabled), so they simply reload on their next message
+        while self.conversations:
+            oldest = next(iter(self.conversations))
+            over_capacity = len(self.conversations) > settings.max_in_memory_sessions
+            expired = now - self._last_access.get(oldest, now) >= settings.session_ttl_seconds
+            if not (over_capacity or expired) or oldest == phone_number:
+                break
+            del self.conversations[oldest]
+            self._last_access.pop(oldest, None)
+    
+    async def _load_cached_conversation(self, phone_number: str) -> Optional[ConversationContext]:
+        """Fetch a conversation from Redis, or None if unavailable"""
+        if not self.redis:
+            return None
+        try:
+            payload = await self.redis.get(f"{REDIS_KEY_PREFIX}{phone_number}")
+        except Exception as e:
+            logger.warning("Could not read conversation from Redis: %s", e)
+            return None
+        if not payload:
+            return None
+        try:
+            return ConversationContext.from_dict(json.loads(payload))
+        except (ValueError, TypeError, AttributeError):
+            logger.warning("Discarding invalid cached conversation for %s", phone_number)
+            return None
     
-    def _is_first_message(self, conversation: dict) -> bool:
+    def _schedule_persist(self, phone_number: str, conversation: ConversationContext) -> None:
+        """Queue the conversation for Redis without blocking the response path"""
+        if not self.redis:
+            return
+        payload = json.dumps(conversation.to_dict(), ensure_ascii=False, default=str)
+        if self._write_queue is None:
+            self._write_queue = asyncio.Queue()
+        if self._writer_task is None or self._writer_task.done():
+            self._writer_task = asyncio.create_task(self._writer_loop())
+        self._write_queue.put_nowait((phone_number, payload))
+    
+    async def _writer_loop(self) -> None:
+        """Drain queued snapshots and write each burst in one pipelined round-trip"""
+        while True:
+            phone_number, payload = await self._write_queue.get()
+            # Later snapshots of the same conversation supersede earlier ones
+            pending = {phone_number: payload}
+            while not self._write_queue.empty():
+                phone_number, payload = self._write_queue.get_nowait()
+                pending[phone_number] = payload
+            await self._flush_conversations(pending)
+    
+    async def _flush_conversations(self, pending: Dict[str, str]) -> None:
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for phone_number, payload in pending.items():
+                    pipe.set(
+                        f"{REDIS_KEY_PREFIX}{phone_number}",
+                        payload,
+                        ex=settings.redis_conversation_ttl,
+                    )
+                await pipe.execute()
+        except Exception as e:
+            logger.warning("Could not persist %d conversations to Redis: %s", len(pending), e)
+    
+    def _is_first_message(self, conversation: ConversationContext) -> bool:
         """
         Check if this is the first message in the conversation.
         We check BEFORE adding the new message, so we look for empty history.
         """
-        messages = conversation.get("messages", [])
-        
-        # If no messages in history, it's definitely the first
-        if len(messages) == 0:
-            return True
-        
-        # Count only user messages (not bot responses)
-        user_messages = [msg for msg in messages if msg.get("role") == "user"]
-        
-        # If no user messages yet (only bot responses or empty), it's the first user message
-        return len(user_messages) == 0
+        # Only user messages count (not bot responses); the counter is kept
+        # in metadata so this stays O(1) as the history grows
+        return conversation.metadata.user_msg_count == 0
+    
+    @staticmethod
+    def _count_user_messages(messages: list) -> int:
+        return sum(1 for msg in messages if msg.get("role") == "user")
 
     def _marketing_scope_prompt(self, reminder: bool = False) -> str:
         if reminder:
@@ -289,16 +433,8 @@ Disculpa, tuve un problema técnico.
             return None
 
         cleaned = message.lower().strip()
-        numeric_map = {
-            '1': 'campaigns',
-            'uno': 'campaigns',
-            '2': 'adsets',
-            'dos': 'adsets',
-            '3': 'ads',
-            'tres': 'ads',
-        }
-        if cleaned in numeric_map:
-            return numeric_map[cleaned]
+        if cleaned in MARKETING_SCOPE_NUMBER_MAP:
+            return MARKETING_SCOPE_NUMBER_MAP[cleaned]
 
         return marketing_analysis.normalize_scope(message)
 
@@ -0,0 +1,51 @@
+"""
+Typed conversation state shared by the bot handlers
+"""
+from dataclasses import asdict, dataclass, field, fields
+from typing import Any, Dict, List, Optional
+
+
+@dataclass(slots=True)
+class ConversationMetadata:
+    """Per-conversation flags and lead info"""
+    lead_status: str = "unknown"
+    lead_id: Optional[int] = None
+    awaiting_marketing_scope: bool = False
+    user_msg_count: int = 0
+    demo_script: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass(slots=True)
+class ConversationContext:
+    """Conversation held in memory (and mirrored to Redis) for one contact"""
+    phone: str
+    name: str
+    messages: List[Dict[str, Any]] = field(default_factory=list)
+    created_at: Optional[str] = None
+    last_interaction: Optional[str] = None
+    metadata: ConversationMetadata = field(default_factory=ConversationMetadata)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain dict suitable for JSON serialization"""
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ConversationContext":
+        """Rebuild a context from `to_dict` output, ignoring unknown keys"""
+        messages = data.get("messages") or []
+        raw_metadata = data.get("metadata") or {}
+        known = {f.name for f in fields(ConversationMetadata)}
+        metadata = ConversationMetadata(
+            **{key: value for key, value in raw_metadata.items() if key in known}
+        )
+        if "user_msg_count" not in raw_metadata:
+            metadata.user_msg_count = sum(1 for msg in messages if msg.get("role") == "user")
+
+        return cls(
+            phone=data.get("phone", ""),
+            name=data.get("name", ""),
+            messages=messages,
+            created_at=data.get("created_at"),
+            last_interaction=data.get("last_interaction"),
+            metadata=metadata,
+        )
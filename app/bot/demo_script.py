@@ -1,5 +1,7 @@
 """Hardcoded responses for the WhatsApp demo script."""
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Tuple
+
+from app.bot.conversation_state import ConversationContext
 
 
 class DemoScriptHandler:
@@ -44,15 +46,20 @@ class DemoScriptHandler:
         "Listo, desde ahora te aviso antes de que tus campañas se vuelvan poco rentables 😉"
     )
 
-    def get_response(self, message_text: str, conversation: Dict[str, Any]) -> Optional[str]:
+    # prompt -> (response, whether the next message should be the ROAS window)
+    SCRIPTED_PROMPTS: Dict[str, Tuple[str, bool]] = {
+        SALES_ALERT_PROMPT: (SALES_ALERT_RESPONSE, False),
+        ROAS_ALERT_PROMPT: (ROAS_ALERT_RESPONSE, True),
+    }
+
+    def get_response(self, message_text: str, conversation: ConversationContext) -> Optional[str]:
         """
         Return a scripted response when the incoming message matches the demo prompts.
         """
         if not message_text:
             return None
 
-        metadata = conversation.setdefault("metadata", {})
-        script_state = metadata.setdefault("demo_script", {})
+        script_state = conversation.metadata.demo_script
         awaiting_window = script_state.get("awaiting_roas_window", False)
 
         normalized = self._normalize(message_text)
@@ -63,18 +70,18 @@ class DemoScriptHandler:
                 return self.ROAS_WINDOW_RESPONSE
             return None
 
-        if normalized == self.SALES_ALERT_PROMPT:
-            return self.SALES_ALERT_RESPONSE
+        scripted = self.SCRIPTED_PROMPTS.get(normalized)
+        if scripted is None:
+            return None
 
-        if normalized == self.ROAS_ALERT_PROMPT:
+        response, awaits_window = scripted
+        if awaits_window:
             script_state["awaiting_roas_window"] = True
-            return self.ROAS_ALERT_RESPONSE
-
-        return None
+        return response
 
     @staticmethod
     def _normalize(text: str) -> str:
         """Normalize text for comparison."""
-        return " ".join(text.lower().strip().split())
+        return " ".join(text.lower().split())
 
 
@@ -2,22 +2,27 @@
 FAQ Handler - predefined responses for business analytics questions
 """
 import logging
-from typing import Optional
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, Optional, Pattern, Tuple
 from app.config import get_settings
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
 
-class FAQHandler:
-    """Handle frequently asked analytics questions with predefined answers"""
-    
-    def __init__(self):
-        business_name = settings.business_name
-        
-        self.faqs = {
-            # Ayuda general
-            "ayuda": f"""📊 **¿Cómo puedo ayudarte?**
+@lru_cache(maxsize=4)
+def _build_faqs(business_name: str) -> Tuple[Dict[str, str], Dict[str, int], Pattern[str]]:
+    """
+    Build the FAQ table and its keyword matcher once per business name
+
+    Returns:
+        (keyword -> answer with aliases resolved, keyword -> priority, compiled pattern)
+    """
+    faqs = {
+        # Ayuda general
+        "ayuda": f"""📊 **¿Cómo puedo ayudarte?**
 
 Puedo consultar reportes y métricas de {business_name}:
 
@@ -34,14 +39,14 @@ Puedo consultar reportes y métricas de {business_name}:
 - O pregunta directamente
 
 ¿Qué te gustaría revisar?""",
-            
-            "help": "ayuda",  # Alias
-            "comandos": "ayuda",  # Alias
-            "que puedo preguntar": "ayuda",  # Alias
-            "menu": "ayuda",  # Alias
-            
-            # Ventas - con números
-            "ventas": """📈 **Consultar Ventas**
+        
+        "help": "ayuda",  # Alias
+        "comandos": "ayuda",  # Alias
+        "que puedo preguntar": "ayuda",  # Alias
+        "menu": "ayuda",  # Alias
+        
+        # Ventas - con números
+        "ventas": """📈 **Consultar Ventas**
 
 **Opciones disponibles:**
 1️⃣ Ventas del mes actual
@@ -53,17 +58,16 @@ Puedo consultar reportes y métricas de {business_name}:
 Escribe el número (1, 2, 3...) o pregunta directamente.
 
 Consultando la base de datos...""",
-            
-            "venta": "ventas",  # Alias
-            "ingresos": "ventas",  # Alias
-            "revenue": "ventas",  # Alias
-            "facturación": "ventas",  # Alias
-            "facturacion": "ventas",  # Alias
-            "1": "ventas",  # Número como comando
-            "uno": "ventas",  # Alias
-            
-            # Marketing - con números
-            "marketing": """📱 **Reportes de Marketing**
+        
+        "venta": "ventas",  # Alias
+        "ingresos": "ventas",  # Alias
+        "revenue": "ventas",  # Alias
+        "facturación": "ventas",  # Alias
+        "1": "ventas",  # Número como comando
+        "uno": "ventas",  # Alias
+        
+        # Marketing - con números
+        "marketing": """📱 **Reportes de Marketing**
 
 **Opciones disponibles:**
 1️⃣ Gastos en publicidad del mes
@@ -75,18 +79,17 @@ Consultando la base de datos...""",
 Escribe el número (1, 2, 3...) o pregunta directamente.
 
 Consultando la base de datos...""",
-            
-            "publicidad": "marketing",  # Alias
-            "anuncios": "marketing",  # Alias
-            "anuncio": "marketing",  # Alias
-            "ads": "marketing",  # Alias
-            "campaña": "marketing",  # Alias
-            "campana": "marketing",  # Alias
-            "2": "marketing",  # Número como comando
-            "dos": "marketing",  # Alias
-            
-            # Productos - con números
-            "productos más vendidos": """📦 **Productos Más Vendidos**
+        
+        "publicidad": "marketing",  # Alias
+        "anuncios": "marketing",  # Alias
+        "anuncio": "marketing",  # Alias
+        "ads": "marketing",  # Alias
+        "campaña": "marketing",  # Alias
+        "2": "marketing",  # Número como comando
+        "dos": "marketing",  # Alias
+        
+        # Productos - con números
+        "productos más vendidos": """📦 **Productos Más Vendidos**
 
 **Opciones disponibles:**
 1️⃣ Top productos del mes
@@ -97,16 +100,16 @@ Consultando la base de datos...""",
 Escribe el número (1, 2, 3...) o pregunta directamente.
 
 Consultando la base de datos...""",
-            
-            "top productos": "productos más vendidos",  # Alias
-            "best sellers": "productos más vendidos",  # Alias
-            "productos vendidos": "productos más vendidos",  # Alias
-            "productos": "productos más vendidos",  # Alias
-            "4": "productos más vendidos",  # Número como comando
-            "cuatro": "productos más vendidos",  # Alias
-            
-            # Financiero - con números
-            "gastos": """💰 **Análisis de Gastos**
+        
+        "top productos": "productos más vendidos",  # Alias
+        "best sellers": "productos más vendidos",  # Alias
+        "productos vendidos": "productos más vendidos",  # Alias
+        "productos": "productos más vendidos",  # Alias
+        "4": "productos más vendidos",  # Número como comando
+        "cuatro": "productos más vendidos",  # Alias
+        
+        # Financiero - con números
+        "gastos": """💰 **Análisis de Gastos**
 
 **Opciones disponibles:**
 1️⃣ Gastos del mes
@@ -118,16 +121,16 @@ Consultando la base de datos...""",
 Escribe el número (1, 2, 3...) o pregunta directamente.
 
 Consultando la base de datos...""",
-            
-            "gasto": "gastos",  # Alias
-            "costos": "gastos",  # Alias
-            "financiero": "gastos",  # Alias
-            "margen": "gastos",  # Alias
-            "5": "gastos",  # Número como comando
-            "cinco": "gastos",  # Alias
-            
-            # Reportes generales - con números
-            "reporte": """📊 **Reportes Disponibles**
+        
+        "gasto": "gastos",  # Alias
+        "costos": "gastos",  # Alias
+        "financiero": "gastos",  # Alias
+        "margen": "gastos",  # Alias
+        "5": "gastos",  # Número como comando
+        "cinco": "gastos",  # Alias
+        
+        # Reportes generales - con números
+        "reporte": """📊 **Reportes Disponibles**
 
 **Opciones disponibles:**
 1️⃣ Reporte del mes
@@ -139,28 +142,63 @@ Consultando la base de datos...""",
 Escribe el número (1, 2, 3...) o pregunta directamente.
 
 Consultando la base de datos...""",
-            
-            "reportes": "reporte",  # Alias
-            "métricas": "reporte",  # Alias
-            "metricas": "reporte",  # Alias
-            "análisis": "reporte",  # Alias
-            "analisis": "reporte",  # Alias
-            "dashboard": "reporte",  # Alias
-            "6": "reporte",  # Número como comando
-            "seis": "reporte",  # Alias
-        }
-        
-        # Mapeo de números a opciones específicas de ventas
-        self.sales_options = {
-            "1": "ventas del mes",
-            "mes": "ventas del mes",
-            "2": "ventas de la semana",
-            "semana": "ventas de la semana",
-            "3": "ventas de hoy",
-            "hoy": "ventas de hoy",
-            "dia": "ventas de hoy",
-            "día": "ventas de hoy",
-        }
+        
+        "reportes": "reporte",  # Alias
+        "métricas": "reporte",  # Alias
+        "análisis": "reporte",  # Alias
+        "dashboard": "reporte",  # Alias
+        "6": "reporte",  # Número como comando
+        "seis": "reporte",  # Alias
+    }
+
+    # Keys are stored accent-free so "análisis" and "analisis" share one entry,
+    # and alias values are replaced with their final answer
+    resolved: Dict[str, str] = {}
+    # Earlier keywords win when several appear in the same message
+    priority: Dict[str, int] = {}
+    for idx, keyword in enumerate(faqs):
+        canonical = _canonicalize(keyword)
+        if canonical not in resolved:
+            resolved[canonical] = _resolve_alias(faqs, keyword)
+            priority[canonical] = idx
+    alternation = "|".join(
+        re.escape(keyword) for keyword in sorted(resolved, key=len, reverse=True)
+    )
+    return resolved, priority, re.compile(rf"\b(?:{alternation})\b")
+
+
+def _canonicalize(text: str) -> str:
+    """Lowercase and strip accents (NFKD) for accent-insensitive matching"""
+    normalized = unicodedata.normalize("NFKD", text.lower())
+    return "".join(ch for ch in normalized if not unicodedata.combining(ch))
+
+
+def _resolve_alias(faqs: Dict[str, str], keyword: str) -> str:
+    """Follow alias entries until reaching an actual FAQ answer"""
+    response = faqs[keyword]
+    seen = {keyword}
+    while response in faqs and response not in seen:
+        seen.add(response)
+        response = faqs[response]
+    return response
+
+
+class FAQHandler:
+    """Handle frequently asked analytics questions with predefined answers"""
+    
+    # Mapeo de números a opciones específicas de ventas
+    SALES_OPTIONS = {
+        "1": "ventas del mes",
+        "mes": "ventas del mes",
+        "2": "ventas de la semana",
+        "semana": "ventas de la semana",
+        "3": "ventas de hoy",
+        "hoy": "ventas de hoy",
+        "dia": "ventas de hoy",
+    }
+    
+    def __init__(self):
+        self.faqs, self._priority, self._pattern = _build_faqs(settings.business_name)
     
     def get_response(self, message: str) -> Optional[str]:
         """
@@ -172,21 +210,18 @@ Consultando la base de datos...""",
         Returns:
             FAQ response or None
         """
-        message_lower = message.lower().strip()
+        message_lower = _canonicalize(message).strip()
         
         # Check for numbered options in sales context
-        if message_lower in self.sales_options:
+        if message_lower in self.SALES_OPTIONS:
             # This will be handled by the AI with context
             return None
         
-        # Check for exact matches or keywords
-        for keyword, response in self.faqs.items():
-            if keyword in message_lower:
-                # If response is an alias, get the actual response
-                if isinstance(response, str) and response in self.faqs:
-                    response = self.faqs[response]
-                
-                logger.info(f"FAQ match found for keyword: {keyword}")
-                return response
-        
-        return None
+        # Check for keywords with a single compiled scan
+        matches = [match.group(0) for match in self._pattern.finditer(message_lower)]
+        if not matches:
+            return None
+        
+        keyword = min(matches, key=self._priority.__getitem__)
+        logger.info(f"FAQ match found for keyword: {keyword}")
+        return self.faqs[keyword]
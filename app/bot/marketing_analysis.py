@@ -2,15 +2,28 @@
 
 from __future__ import annotations
 
+import heapq
 import logging
 import math
+import re
 import unicodedata
+from collections import defaultdict
 from datetime import datetime
 from decimal import Decimal
+from functools import lru_cache
 from typing import Dict, Iterable, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Deletes every combining mark in the Basic Multilingual Plane via str.translate
+_COMBINING_MARKS = {cp: None for cp in range(0x10000) if unicodedata.combining(chr(cp))}
+
+# Currency, thousands and percent symbols removed before float conversion
+_NUMERIC_NOISE = str.maketrans("", "", "$,%")
+
+# Leading "YYYY-MM-DD[ HH:MM[:SS]]" of values fromisoformat rejects
+_DATE_PREFIX = re.compile(r"(\d{4})-(\d{2})-(\d{2})(?:[T ](\d{2}):(\d{2})(?::(\d{2}))?)?")
+
 SCOPE_ALIASES = {
     "campaign": "campaigns",
     "campaigns": "campaigns",
@@ -37,7 +50,7 @@ SCOPE_CONFIG = {
     "campaigns": {
         "label": "campañas",
         "singular": "campaña",
-        "group_keys": [
+        "group_keys": (
             "campaign_name",
             "name_campaign",
             "campaign",
@@ -46,20 +59,20 @@ SCOPE_CONFIG = {
             "nombre_campaña",
             "campaign_title",
             "titulo_campana",
-        ],
-        "id_keys": [
+        ),
+        "id_keys": (
             "campaign_id",
             "id_campaign",
             "id_campana",
             "id_campaña",
             "campaignid",
             "campana_id",
-        ],
+        ),
     },
     "adsets": {
         "label": "conjuntos de anuncios",
         "singular": "conjunto de anuncios",
-        "group_keys": [
+        "group_keys": (
             "adset_name",
             "ad_set_name",
             "name_adset",
@@ -68,38 +81,38 @@ SCOPE_CONFIG = {
             "conjunto_de_anuncios",
             "nombre_conjunto",
             "nombre_conjunto_de_anuncios",
-        ],
-        "id_keys": [
+        ),
+        "id_keys": (
             "adset_id",
             "id_adset",
             "conjunto_id",
             "conjunto_anuncios_id",
             "adsetid",
-        ],
+        ),
     },
     "ads": {
         "label": "anuncios",
         "singular": "anuncio",
-        "group_keys": [
+        "group_keys": (
             "ad_name",
             "name_ad",
             "ad",
             "nombre_anuncio",
             "ad_title",
             "titulo_anuncio",
-        ],
-        "id_keys": [
+        ),
+        "id_keys": (
             "ad_id",
             "id_ad",
             "id_anuncio",
             "anuncio_id",
             "adid",
             "creative_id",
-        ],
+        ),
     },
 }
 
-SPEND_KEYS = [
+SPEND_KEYS = (
     "amount_spent",
     "spend",
     "gasto",
@@ -112,9 +125,9 @@ SPEND_KEYS = [
     "coste",
     "monto_gastado",
     "spent",
-]
+)
 
-SPEND_SUBSTRINGS = [
+SPEND_SUBSTRINGS = (
     "spend",
     "gasto",
     "costo",
@@ -122,9 +135,9 @@ SPEND_SUBSTRINGS = [
     "inversion",
     "investment",
     "budget",
-]
+)
 
-REVENUE_KEYS = [
+REVENUE_KEYS = (
     "revenue",
     "ingresos",
     "income",
@@ -135,9 +148,9 @@ REVENUE_KEYS = [
     "valor",
     "value",
     "compras_valor",
-]
+)
 
-REVENUE_SUBSTRINGS = [
+REVENUE_SUBSTRINGS = (
     "revenue",
     "ingreso",
     "venta",
@@ -147,9 +160,9 @@ REVENUE_SUBSTRINGS = [
     "earned",
     "monto",
     "amount",
-]
+)
 
-CONVERSION_KEYS = [
+CONVERSION_KEYS = (
     "conversions",
     "conversiones",
     "purchases",
@@ -159,9 +172,9 @@ CONVERSION_KEYS = [
     "resultados",
     "results",
     "leads",
-]
+)
 
-CONVERSION_SUBSTRINGS = [
+CONVERSION_SUBSTRINGS = (
     "conversion",
     "purchase",
     "compra",
@@ -169,39 +182,39 @@ CONVERSION_SUBSTRINGS = [
     "resultado",
     "lead",
     "registro",
-]
+)
 
-CPC_KEYS = [
+CPC_KEYS = (
     "cpc",
     "cost_per_click",
     "costo_por_click",
     "costo_por_clic",
     "coste_por_clic",
     "coste_por_click",
-]
+)
 
-CPC_SUBSTRINGS = [
+CPC_SUBSTRINGS = (
     "cpc",
     "cost_per_click",
     "costo_por_click",
     "coste_por_click",
-]
+)
 
-CLICKS_KEYS = [
+CLICKS_KEYS = (
     "clicks",
     "link_clicks",
     "click",
     "clics",
     "clics_enlace",
     "clicks_enlace",
-]
+)
 
-CLICKS_SUBSTRINGS = [
+CLICKS_SUBSTRINGS = (
     "click",
     "clic",
-]
+)
 
-DATE_START_KEYS = [
+DATE_START_KEYS = (
     "start_date",
     "fecha_inicio",
     "period_start",
@@ -209,17 +222,42 @@ DATE_START_KEYS = [
     "fecha",
     "date",
     "created_at",
-]
+)
 
-DATE_END_KEYS = [
+DATE_END_KEYS = (
     "end_date",
     "fecha_fin",
     "period_end",
     "fin",
     "updated_at",
-]
-
-
+)
+
+
+# Membership sets mirroring the priority-ordered key tuples above
+SPEND_KEY_SET = frozenset(SPEND_KEYS)
+REVENUE_KEY_SET = frozenset(REVENUE_KEYS)
+CONVERSION_KEY_SET = frozenset(CONVERSION_KEYS)
+CPC_KEY_SET = frozenset(CPC_KEYS)
+CLICKS_KEY_SET = frozenset(CLICKS_KEYS)
+DATE_START_KEY_SET = frozenset(DATE_START_KEYS)
+DATE_END_KEY_SET = frozenset(DATE_END_KEYS)
+
+# (field, priority keys, key set, substring hints) for each summed metric
+METRIC_FIELDS = (
+    ("spend", SPEND_KEYS, SPEND_KEY_SET, SPEND_SUBSTRINGS),
+    ("revenue", REVENUE_KEYS, REVENUE_KEY_SET, REVENUE_SUBSTRINGS),
+    ("conversions", CONVERSION_KEYS, CONVERSION_KEY_SET, CONVERSION_SUBSTRINGS),
+    ("clicks", CLICKS_KEYS, CLICKS_KEY_SET, CLICKS_SUBSTRINGS),
+    ("cpc", CPC_KEYS, CPC_KEY_SET, CPC_SUBSTRINGS),
+)
+
+# Bound formatter for one top-list row; fields come from `_entity_display`
+_TOP_ROW_TEMPLATE = (
+    "{idx}. *{name}* — {revenue} | conv. {conversions} | {roas} | CPC {cpc} | gasto {spend}"
+).format
+
+
+@lru_cache(maxsize=256)
 def normalize_scope(scope: str) -> Optional[str]:
     """Normalize textual scope into canonical key."""
 
@@ -230,11 +268,11 @@ def normalize_scope(scope: str) -> Optional[str]:
     if not cleaned:
         return None
 
-    if cleaned in SCOPE_ALIASES:
-        return SCOPE_ALIASES[cleaned]
+    if cleaned in _CLEANED_SCOPE_ALIASES:
+        return _CLEANED_SCOPE_ALIASES[cleaned]
 
     # Try to match via contains logic
-    for alias, canonical in SCOPE_ALIASES.items():
+    for alias, canonical in _CLEANED_SCOPE_ALIASES.items():
         if alias in cleaned:
             return canonical
 
@@ -259,18 +297,9 @@ def build_marketing_report(data: List[Dict], scope: str) -> str:
             "Verifica que la vista incluya columnas con nombres y métricas."
         )
 
-    sorted_entities = sorted(
-        aggregates.values(),
-        key=lambda entry: (
-            entry.get("revenue", 0.0),
-            entry.get("conversions", 0.0),
-            entry.get("roi", 0.0),
-        ),
-        reverse=True,
-    )
-
-    best_entity = sorted_entities[0]
-    top_entities = sorted_entities[: min(3, len(sorted_entities))]
+    # Only the top 3 are rendered, so a bounded heap beats sorting every group
+    top_entities = heapq.nlargest(3, aggregates.values(), key=_ranking_key)
+    best_entity = top_entities[0]
 
     header = _build_header(config, overall)
     summary = _build_summary_lines(overall)
@@ -290,48 +319,72 @@ def build_marketing_report(data: List[Dict], scope: str) -> str:
     return "\n\n".join(filter(None, sections))
 
 
+def _ranking_key(entry: Dict) -> Tuple[float, float, float]:
+    # ROI is None for groups without spend; rank those as 0 so ties stay comparable
+    return entry["revenue"], entry["conversions"], entry["roi"] or 0.0
+
+
+def _new_entry() -> Dict:
+    return {
+        "name": "",
+        "ids": [],
+        "spend": 0.0,
+        "revenue": 0.0,
+        "conversions": 0.0,
+        "clicks": 0.0,
+        "cpc_total": 0.0,
+        "cpc_count": 0,
+    }
+
+
 def _aggregate_marketing_data(data: List[Dict], config: Dict) -> Tuple[Dict[str, Dict], Dict]:
-    aggregates: Dict[str, Dict] = {}
+    aggregates: Dict[str, Dict] = defaultdict(_new_entry)
     overall = {
         "total_records": len(data),
         "spend": 0.0,
         "revenue": 0.0,
         "conversions": 0.0,
         "clicks": 0.0,
-        "cpc_samples": [],
+        "cpc_total": 0.0,
+        "cpc_count": 0,
         "start_date": None,
         "end_date": None,
     }
 
+    extract_numeric = _extract_numeric
+    extract_date = _extract_date
+    schema_keys = None
+
     for row in data:
-        name = _get_first_non_empty(row, config["group_keys"])
+        # Rows from one view share their columns, so aliases are resolved once
+        # and only re-resolved if a row arrives with a different shape.
+        if schema_keys is None or row.keys() != schema_keys:
+            schema_keys = row.keys()
+            columns = _resolve_columns(row, config)
+            name_cols, id_cols = columns["name"], columns["id"]
+            spend_cols, revenue_cols = columns["spend"], columns["revenue"]
+            conversion_cols, clicks_cols, cpc_cols = columns["conversions"], columns["clicks"], columns["cpc"]
+            start_cols, end_cols = columns["start_date"], columns["end_date"]
+
+        name = _get_first_non_empty(row, name_cols)
         if not name:
             logger.debug("Skipping row without %s name: %s", config["label"], row)
             continue
 
-        key = str(name).strip()
-        entry = aggregates.setdefault(
-            key,
-            {
-                "name": key,
-                "ids": set(),
-                "spend": 0.0,
-                "revenue": 0.0,
-                "conversions": 0.0,
-                "clicks": 0.0,
-                "cpc_samples": [],
-            },
-        )
+        key = name.strip()
+        entry = aggregates[key]
+        if not entry["name"]:
+            entry["name"] = key
 
-        entity_id = _get_first_non_empty(row, config["id_keys"])
+        entity_id = _get_first_non_empty(row, id_cols)
         if entity_id:
-            entry["ids"].add(str(entity_id))
+            entry["ids"].append(entity_id)
 
-        spend = _extract_numeric(row, SPEND_KEYS, SPEND_SUBSTRINGS)
-        revenue = _extract_numeric(row, REVENUE_KEYS, REVENUE_SUBSTRINGS)
-        conversions = _extract_numeric(row, CONVERSION_KEYS, CONVERSION_SUBSTRINGS)
-        clicks = _extract_numeric(row, CLICKS_KEYS, CLICKS_SUBSTRINGS)
-        cpc_value = _extract_numeric(row, CPC_KEYS, CPC_SUBSTRINGS)
+        spend = extract_numeric(row, spend_cols)
+        revenue = extract_numeric(row, revenue_cols)
+        conversions = extract_numeric(row, conversion_cols)
+        clicks = extract_numeric(row, clicks_cols)
+        cpc_value = extract_numeric(row, cpc_cols)
 
         entry["spend"] += spend
         entry["revenue"] += revenue
@@ -339,37 +392,36 @@ def _aggregate_marketing_data(data: List[Dict], config: Dict) -> Tuple[Dict[str,
         entry["clicks"] += clicks
 
         if cpc_value:
-            entry["cpc_samples"].append(cpc_value)
+            entry["cpc_total"] += cpc_value
+            entry["cpc_count"] += 1
 
         overall["spend"] += spend
         overall["revenue"] += revenue
         overall["conversions"] += conversions
         overall["clicks"] += clicks
         if cpc_value:
-            overall["cpc_samples"].append(cpc_value)
+            overall["cpc_total"] += cpc_value
+            overall["cpc_count"] += 1
 
-        overall["start_date"] = _min_date(
-            overall["start_date"], _extract_date(row, DATE_START_KEYS)
-        )
-        overall["end_date"] = _max_date(
-            overall["end_date"], _extract_date(row, DATE_END_KEYS)
-        )
+        overall["start_date"] = _min_date(overall["start_date"], extract_date(row, start_cols))
+        overall["end_date"] = _max_date(overall["end_date"], extract_date(row, end_cols))
 
     for entry in aggregates.values():
-        entry["roi"] = _safe_div(entry["revenue"], entry["spend"])
+        spend = entry["spend"]
+        entry["roi"] = entry["revenue"] / spend if spend else None
         if entry["clicks"] > 0:
-            entry["cpc"] = _safe_div(entry["spend"], entry["clicks"])
-        elif entry["cpc_samples"]:
-            entry["cpc"] = sum(entry["cpc_samples"]) / len(entry["cpc_samples"])
+            entry["cpc"] = spend / entry["clicks"]
+        elif entry["cpc_count"]:
+            entry["cpc"] = entry["cpc_total"] / entry["cpc_count"]
         else:
             entry["cpc"] = None
-        entry["ids"] = sorted(entry["ids"])
+        entry["ids"] = sorted(set(entry["ids"]))
 
     overall["roi"] = _safe_div(overall["revenue"], overall["spend"])
     if overall["clicks"] > 0:
         overall["cpc"] = _safe_div(overall["spend"], overall["clicks"])
-    elif overall["cpc_samples"]:
-        overall["cpc"] = sum(overall["cpc_samples"]) / len(overall["cpc_samples"])
+    elif overall["cpc_count"]:
+        overall["cpc"] = overall["cpc_total"] / overall["cpc_count"]
     else:
         overall["cpc"] = None
 
@@ -407,38 +459,42 @@ def _build_summary_lines(overall: Dict) -> str:
 
 def _build_standout(best: Dict, config: Dict) -> str:
     label = config["singular"].capitalize()
-    spend = _format_currency(best.get("spend"))
-    revenue = _format_currency(best.get("revenue"))
-    conversions = _format_number(best.get("conversions", 0))
-    roas = best.get("roi")
-    roas_text = f"ROAS {roas:.2f}x" if roas and roas > 0 else "ROAS n/d"
-    cpc = best.get("cpc")
-    cpc_text = _format_currency(cpc) if cpc and cpc > 0 else "n/d"
+    display = _entity_display(best)
     ids = ", ".join(best.get("ids", []))
     id_text = f" | IDs: {ids}" if ids else ""
 
     return (
         f"🥇 {label} destacada: *{best.get('name', 'Sin nombre')}*"
-        f" — {revenue} ({roas_text}), {conversions} conv., CPC {cpc_text}, inversión {spend}{id_text}"
+        f" — {display['revenue']} ({display['roas']}), {display['conversions']} conv.,"
+        f" CPC {display['cpc']}, inversión {display['spend']}{id_text}"
     )
 
 
 def _build_top_list(top_entities: List[Dict], config: Dict) -> str:
     lines = [f"📌 Top {len(top_entities)} {config['label']}:"]
     for idx, entry in enumerate(top_entities, start=1):
-        spend = _format_currency(entry.get("spend"))
-        revenue = _format_currency(entry.get("revenue"))
-        conversions = _format_number(entry.get("conversions", 0))
-        roas = entry.get("roi")
-        roas_text = f"ROAS {roas:.2f}x" if roas and roas > 0 else "ROAS n/d"
-        cpc = entry.get("cpc")
-        cpc_text = _format_currency(cpc) if cpc and cpc > 0 else "n/d"
         lines.append(
-            f"{idx}. *{entry.get('name', 'Sin nombre')}* — {revenue} | conv. {conversions} | {roas_text} | CPC {cpc_text} | gasto {spend}"
+            _TOP_ROW_TEMPLATE(idx=idx, name=entry.get("name", "Sin nombre"), **_entity_display(entry))
         )
     return "\n".join(lines)
 
 
+def _entity_display(entry: Dict) -> Dict[str, str]:
+    """Formatted metrics for an entity, built on first use and reused by later sections."""
+    display = entry.get("display")
+    if display is None:
+        roas = entry.get("roi")
+        cpc = entry.get("cpc")
+        display = entry["display"] = {
+            "spend": _format_currency(entry.get("spend")),
+            "revenue": _format_currency(entry.get("revenue")),
+            "conversions": _format_number(entry.get("conversions", 0)),
+            "roas": f"ROAS {roas:.2f}x" if roas and roas > 0 else "ROAS n/d",
+            "cpc": _format_currency(cpc) if cpc and cpc > 0 else "n/d",
+        }
+    return display
+
+
 def _build_coverage(overall: Dict) -> Optional[str]:
     total = overall.get("total_records", 0)
     if total <= 0:
@@ -450,26 +506,44 @@ def _build_coverage(overall: Dict) -> Optional[str]:
     return detail
 
 
-def _extract_numeric(row: Dict, keys: Iterable[str], substrings: Optional[Iterable[str]] = None) -> float:
-    for key in keys:
-        if key in row and row[key] is not None:
-            value = _to_float(row[key])
-            if value is not None:
-                return value
-    if substrings:
-        lowered_items = ((k.lower(), v) for k, v in row.items() if v is not None)
-        for key_lower, value in lowered_items:
-            if any(sub in key_lower for sub in substrings):
-                maybe = _to_float(value)
-                if maybe is not None:
-                    return maybe
+def _resolve_columns(sample: Dict, config: Dict) -> Dict[str, Tuple[str, ...]]:
+    """Pick, from a sample row, the columns to read for every report field.
+
+    Exact aliases keep their priority order; for metrics, columns matching a
+    substring hint follow in row order as the fallback.
+    """
+    columns: Dict[str, Tuple[str, ...]] = {
+        "name": tuple(key for key in config["group_keys"] if key in sample),
+        "id": tuple(key for key in config["id_keys"] if key in sample),
+        "start_date": tuple(key for key in DATE_START_KEYS if key in sample),
+        "end_date": tuple(key for key in DATE_END_KEYS if key in sample),
+    }
+    for field, keys, key_set, substrings in METRIC_FIELDS:
+        exact = tuple(key for key in keys if key in sample)
+        fallback = tuple(
+            key
+            for key in sample
+            if key not in key_set and any(sub in key.lower() for sub in substrings)
+        )
+        columns[field] = exact + fallback
+    return columns
+
+
+def _extract_numeric(row: Dict, columns: Tuple[str, ...]) -> float:
+    for key in columns:
+        value = row.get(key)
+        if value is not None:
+            numeric = _to_float(value)
+            if numeric is not None:
+                return numeric
     return 0.0
 
 
-def _extract_date(row: Dict, keys: Iterable[str]) -> Optional[datetime]:
-    for key in keys:
-        if key in row and row[key]:
-            parsed = _parse_date(row[key])
+def _extract_date(row: Dict, columns: Tuple[str, ...]) -> Optional[datetime]:
+    for key in columns:
+        value = row.get(key)
+        if value:
+            parsed = _parse_date(value)
             if parsed:
                 return parsed
     return None
@@ -490,21 +564,18 @@ def _parse_date(value) -> Optional[datetime]:
         text = value.strip()
         if not text:
             return None
-        for fmt in (
-            "%Y-%m-%d",
-            "%Y-%m-%d %H:%M:%S",
-            "%Y-%m-%dT%H:%M:%S",
-            "%Y-%m-%dT%H:%M:%S.%f",
-        ):
-            try:
-                return datetime.strptime(text[: len(fmt)], fmt)
-            except ValueError:
-                continue
         try:
-            return datetime.fromisoformat(text)
+            return datetime.fromisoformat(text.replace("Z", "+00:00"))
         except ValueError:
-            logger.debug("Could not parse date value: %s", value)
-            return None
+            pass
+        match = _DATE_PREFIX.match(text)
+        if match:
+            try:
+                return datetime(*(int(part) for part in match.groups() if part is not None))
+            except ValueError:
+                pass
+        logger.debug("Could not parse date value: %s", value)
+        return None
     return None
 
 
@@ -520,7 +591,7 @@ def _to_float(value) -> Optional[float]:
             return numeric
         return None
     if isinstance(value, str):
-        cleaned = value.replace("$", "").replace(",", "").replace("%", "").strip()
+        cleaned = value.translate(_NUMERIC_NOISE).strip()
         if not cleaned:
             return None
         try:
@@ -563,10 +634,10 @@ def _format_date_range(start: Optional[datetime], end: Optional[datetime]) -> st
     return ""
 
 
+@lru_cache(maxsize=256)
 def _clean_text(value: str) -> str:
-    normalized = unicodedata.normalize("NFKD", value)
-    stripped = "".join(ch for ch in normalized if not unicodedata.combining(ch))
-    return " ".join(stripped.lower().strip().split())
+    stripped = unicodedata.normalize("NFKD", value).translate(_COMBINING_MARKS)
+    return " ".join(stripped.lower().split())
 
 
 def _min_date(current: Optional[datetime], candidate: Optional[datetime]) -> Optional[datetime]:
@@ -581,3 +652,5 @@ def _max_date(current: Optional[datetime], candidate: Optional[datetime]) -> Opt
     return candidate or current
 
 
+# Alias table keyed by cleaned text, built once `_clean_text` is defined
+_CLEANED_SCOPE_ALIASES = {_clean_text(alias): canonical for alias, canonical in SCOPE_ALIASES.items()}
@@ -0,0 +1,72 @@
+"""
+Short-lived cache for AI responses to repeated questions
+"""
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = "ai_response:"
+
+
+class ResponseCache:
+    """
+    Cache AI responses keyed by contact and normalized message text.
+
+    Entries are scoped per phone number so personalized answers (names,
+    orders) never leak between contacts. Uses Redis when a client is
+    provided, otherwise a bounded in-process store.
+    """
+
+    def __init__(self, ttl_seconds: int, redis_client: Any = None, max_entries: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.redis = redis_client
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    @staticmethod
+    def _key(phone_number: str, message: str) -> str:
+        normalized = " ".join(message.lower().split())
+        digest = hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+        return f"{REDIS_KEY_PREFIX}{phone_number}:{digest}"
+
+    async def get(self, phone_number: str, message: str) -> Optional[str]:
+        """Return a cached response or None"""
+        key = self._key(phone_number, message)
+        if self.redis:
+            try:
+                cached = await self.redis.get(key)
+            except Exception as e:
+                logger.warning("Could not read AI response cache: %s", e)
+                return None
+            if cached is None:
+                return None
+            return cached.decode("utf-8") if isinstance(cached, bytes) else cached
+
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, response = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return response
+
+    async def set(self, phone_number: str, message: str, response: str) -> None:
+        """Store a response for the configured TTL"""
+        key = self._key(phone_number, message)
+        if self.redis:
+            try:
+                await self.redis.set(key, response, ex=self.ttl_seconds)
+            except Exception as e:
+                logger.warning("Could not write AI response cache: %s", e)
+            return
+
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
@@ -2,7 +2,7 @@
 Configuration management using Pydantic Settings
 """
 from pydantic_settings import BaseSettings
-from functools import lru_cache
+from functools import cached_property, lru_cache
 from typing import List, Optional
 
 
@@ -28,6 +28,17 @@ class Settings(BaseSettings):
     openai_mcp_route_prefix: str = "/mcp"
     embed_mcp_server: bool = True
     
+    # Conversation cache (optional). When set, conversation context is shared
+    # across workers through Redis instead of living only in process memory.
+    redis_url: Optional[str] = None
+    redis_conversation_ttl: int = 86400
+    # Seconds to reuse an AI answer when a contact repeats the same question (0 = disabled)
+    response_cache_ttl: int = 0
+    
+    # In-memory conversation cache limits
+    max_in_memory_sessions: int = 10000
+    session_ttl_seconds: int = 3600
+    
     # Bot - Business Information (all can be set via env variables)
     bot_name: str = "Asistente Virtual"
     business_name: str = "Mi Tienda"
@@ -43,6 +54,13 @@ class Settings(BaseSettings):
     # Example: "v_products,v_orders,v_stock,v_customers"
     db_views_enabled: str = ""
     
+    # Max concurrent conversation loads (lead + history) hitting the DB pool
+    db_max_concurrency: int = 5
+    
+    # Postgres plan_cache_mode for pooled async connections ("auto",
+    # "force_custom_plan" or "force_generic_plan"); empty keeps the server default
+    db_plan_cache_mode: str = ""
+    
     # Server
     port: int = 8000
     host: str = "0.0.0.0"
@@ -53,11 +71,16 @@ class Settings(BaseSettings):
         env_file = ".env"
         case_sensitive = False
     
-    def get_enabled_views(self) -> List[str]:
-        """Get list of enabled views"""
+    @cached_property
+    def enabled_views(self) -> List[str]:
+        """Enabled views parsed once from DB_VIEWS_ENABLED"""
         if not self.db_views_enabled:
             return []
         return [v.strip() for v in self.db_views_enabled.split(",") if v.strip()]
+    
+    def get_enabled_views(self) -> List[str]:
+        """Get list of enabled views"""
+        return self.enabled_views
 
 
 @lru_cache()
@@ -1,19 +1,71 @@
 """
 Business data queries - Access to specific views for e-commerce data
 """
+import asyncio
 import logging
+import re
+import time
+from collections import OrderedDict
+from contextlib import AsyncExitStack, asynccontextmanager, suppress
 from datetime import date, datetime
-from typing import List, Dict, Optional, Any, Tuple
+from functools import lru_cache
+from typing import List, Dict, FrozenSet, Iterable, Optional, Any, Sequence, Tuple
+
+from psycopg import AsyncConnection
+from psycopg.rows import dict_row
 
 from app.config import get_settings
-from app.db.connection import get_connection
+from app.db.connection import get_async_connection
 
 logger = logging.getLogger(__name__)
 
 settings = get_settings()
 
 
-def _get_first_value(row: Dict[str, Any], candidates: List[str], default=None):
+# Column aliases used by the sales dashboard aggregation, in priority order
+SALES_DAY_COLUMNS = ("dia", "fecha", "day")
+SALES_REVENUE_COLUMNS = ("precio_venta", "revenue_bruto", "revenue", "precio_total", "precio")
+SALES_SHIPPING_COLUMNS = ("costo_envio", "shipping_cost", "envio_total")
+SALES_COST_COLUMNS = ("costo_unitario", "unit_cost", "costo", "costo_producto")
+SALES_ORDER_COLUMNS = (
+    "order_id",
+    "orden_id",
+    "id_orden",
+    "order",
+    "id_order",
+    "orderid",
+    "order_number",
+    "numero_orden",
+)
+
+# Text date formats accepted by _parse_date_value; the last one that matched is tried first
+DATE_FORMATS = ("%Y-%m-%d", "%d-%m-%Y", "%Y/%m/%d")
+_last_date_format = DATE_FORMATS[0]
+
+# Identifiers interpolated into SQL: word characters, plus dots for view names
+_VIEW_NAME_RE = re.compile(r"[\w.]+")
+_COLUMN_NAME_RE = re.compile(r"\w+")
+
+# Comparison operators query_view accepts in (operator, value) filters
+FILTER_OPERATORS = frozenset({"=", "ILIKE", ">", "<"})
+
+# date, time, timestamp, timestamptz and timetz type OIDs
+_TEMPORAL_TYPE_OIDS = frozenset({1082, 1083, 1114, 1184, 1266})
+
+_SALES_COLUMN_SET = frozenset(
+    SALES_DAY_COLUMNS
+    + SALES_REVENUE_COLUMNS
+    + SALES_SHIPPING_COLUMNS
+    + SALES_COST_COLUMNS
+    + SALES_ORDER_COLUMNS
+)
+
+_DATE_COLUMN_TYPES = frozenset({"date", "timestamp without time zone", "timestamp with time zone"})
+_NUMERIC_COLUMN_TYPES = frozenset({"smallint", "integer", "bigint", "numeric", "real", "double precision"})
+_TEXT_COLUMN_TYPES = frozenset({"text", "character varying", "character"})
+
+
+def _get_first_value(row: Dict[str, Any], candidates: Iterable[str], default=None):
     for key in candidates:
         if key in row and row.get(key) is not None:
             return row.get(key)
@@ -28,15 +80,30 @@ def _parse_date_value(value: Any) -> Optional[date]:
     if isinstance(value, date):
         return value
     if isinstance(value, str):
+        global _last_date_format
         value = value.strip()
-        for fmt in ("%Y-%m-%d", "%d-%m-%Y", "%Y/%m/%d"):
+        if len(value) == 10 and value[4] == "-":
+            try:
+                return date.fromisoformat(value)
+            except ValueError:
+                pass
+        try:
+            return datetime.strptime(value, _last_date_format).date()
+        except ValueError:
+            pass
+        for fmt in DATE_FORMATS:
+            if fmt == _last_date_format:
+                continue
             try:
-                return datetime.strptime(value, fmt).date()
+                parsed = datetime.strptime(value, fmt).date()
             except ValueError:
                 continue
+            _last_date_format = fmt
+            return parsed
     return None
 
 
+@lru_cache(maxsize=1024)
 def _normalize_view_name(view_name: str) -> str:
     """Normalize view names for comparison (handle schema prefixes and quotes)."""
     if not view_name:
@@ -47,12 +114,40 @@ def _normalize_view_name(view_name: str) -> str:
     return normalized.lower()
 
 
-ENABLED_VIEWS = {_normalize_view_name(name) for name in settings.get_enabled_views()}
+ENABLED_VIEWS = frozenset(_normalize_view_name(name) for name in settings.get_enabled_views())
 
 if ENABLED_VIEWS:
     logger.info("Database view restrictions enabled: %s", ", ".join(sorted(ENABLED_VIEWS)))
 
 
+# Catalog caches: existing relations, last successful candidate per lookup,
+# view columns and the listed views, all refreshed after VIEW_CACHE_TTL_SECONDS
+VIEW_CACHE_TTL_SECONDS = 300.0
+_known_relations: Optional[FrozenSet[str]] = None
+_known_relations_loaded_at = 0.0
+_known_relations_lock = asyncio.Lock()
+_resolved_views: Dict[Tuple[str, ...], str] = {}
+_view_columns_cache: Dict[str, Tuple[float, Dict[str, Tuple[str, str]]]] = {}
+_available_views: Optional[Tuple[float, Tuple[str, ...]]] = None
+
+
+# Short-lived results of query_view, keyed by SQL text and parameters, so
+# polling dashboards don't hit the database on every request
+QUERY_CACHE_TTL_SECONDS = 10.0
+QUERY_CACHE_MAX_ENTRIES = 256
+_query_cache: "OrderedDict[Tuple[str, Tuple[Any, ...]], Tuple[float, Tuple[Dict, ...]]]" = OrderedDict()
+
+
+def invalidate_views_cache() -> None:
+    """Drop cached catalog lookups, e.g. after creating or dropping views."""
+    global _known_relations, _available_views
+    _known_relations = None
+    _available_views = None
+    _resolved_views.clear()
+    _view_columns_cache.clear()
+    _query_cache.clear()
+
+
 def _is_view_allowed(view_name: str) -> bool:
     """Check if a view is allowed based on configuration."""
     if not ENABLED_VIEWS:
@@ -60,11 +155,11 @@ def _is_view_allowed(view_name: str) -> bool:
     return _normalize_view_name(view_name) in ENABLED_VIEWS
 
 
-def _filter_allowed_views(possible_names: List[str]) -> List[str]:
-    """Filter a list of candidate view names by the enabled views configuration."""
+def _filter_allowed_views(possible_names: Tuple[str, ...]) -> Tuple[str, ...]:
+    """Filter candidate view names by the enabled views configuration."""
     if not ENABLED_VIEWS:
         return possible_names
-    filtered = [name for name in possible_names if _is_view_allowed(name)]
+    filtered = tuple(name for name in possible_names if _is_view_allowed(name))
     if not filtered:
         logger.warning(
             "No enabled views found among candidates: %s. Allowed views: %s",
@@ -74,69 +169,240 @@ def _filter_allowed_views(possible_names: List[str]) -> List[str]:
     return filtered
 
 
-async def query_view(view_name: str, limit: int = 50, filters: Optional[Dict[str, Any]] = None) -> List[Dict]:
+# Columns the order/customer lookups actually use; whichever exist in the view are selected
+ORDER_SUMMARY_COLUMNS = (
+    'id', 'order_id', 'order_date', 'created_at',
+    'product_name', 'producto', 'service_name', 'quantity',
+    'total_revenue', 'total', 'status', 'estado', 'starts_at',
+)
+CUSTOMER_SUMMARY_COLUMNS = (
+    'id', 'phone', 'name', 'customer_name', 'nombre', 'email', 'customer_email',
+)
+
+# Candidate view names per lookup, in priority order, restricted to the enabled views
+PRODUCT_VIEWS = _filter_allowed_views((
+    'v_products', 'view_products', 'products_view',
+    'productos', 'v_productos',
+    'products', 'product',
+))
+ORDER_VIEWS = _filter_allowed_views((
+    'v_orders', 'view_orders', 'orders_view',
+    'pedidos', 'v_pedidos',
+    'orders', 'order',
+))
+STOCK_VIEWS = _filter_allowed_views((
+    'v_stock', 'view_stock', 'stock_view',
+    'inventario', 'v_inventario',
+    'stock', 'inventory',
+))
+CUSTOMER_VIEWS = _filter_allowed_views((
+    'v_customers', 'view_customers', 'customers_view',
+    'clientes', 'v_clientes',
+    'customers', 'customer',
+))
+SALES_REPORT_VIEWS = _filter_allowed_views((
+    'v_sales_report', 'view_sales_report', 'sales_report_view',
+    'v_ventas', 'view_ventas', 'ventas_view',
+    'v_sales', 'view_sales', 'sales_view',
+    'v_revenue', 'view_revenue', 'revenue_view',
+    'v_facturacion', 'facturacion_view',
+))
+MARKETING_VIEWS = _filter_allowed_views((
+    'v_marketing_performance_analysis',
+    'v_marketing_report', 'view_marketing_report', 'marketing_report_view',
+    'v_marketing', 'view_marketing', 'marketing_view',
+    'v_ads', 'view_ads', 'ads_view',
+    'v_publicidad', 'view_publicidad', 'publicidad_view',
+    'v_campaigns', 'view_campaigns', 'campaigns_view',
+    'v_campanas', 'view_campanas', 'campanas_view',
+))
+TOP_PRODUCT_VIEWS = _filter_allowed_views((
+    'v_top_products', 'view_top_products', 'top_products_view',
+    'v_productos_mas_vendidos', 'view_productos_mas_vendidos',
+    'v_best_sellers', 'view_best_sellers', 'best_sellers_view',
+    'v_product_sales', 'view_product_sales', 'product_sales_view',
+))
+FINANCIAL_VIEWS = _filter_allowed_views((
+    'v_financial_report', 'view_financial_report', 'financial_report_view',
+    'v_financiero', 'view_financiero', 'financiero_view',
+    'v_ingresos_gastos', 'view_ingresos_gastos', 'ingresos_gastos_view',
+    'v_expenses', 'view_expenses', 'expenses_view',
+    'v_gastos', 'view_gastos', 'gastos_view',
+))
+ANALYTICS_VIEWS = _filter_allowed_views((
+    'v_analytics', 'view_analytics', 'analytics_view',
+    'v_dashboard', 'view_dashboard', 'dashboard_view',
+    'v_metricas', 'view_metricas', 'metricas_view',
+    'v_estadisticas', 'view_estadisticas', 'estadisticas_view',
+    'v_kpis', 'view_kpis', 'kpis_view',
+))
+
+
+async def _get_known_relations() -> Optional[FrozenSet[str]]:
+    """
+    Normalized names of the tables and views visible on the search path.
+
+    Loaded with one catalog query and refreshed every few minutes. Returns
+    None when the catalog can't be read, so callers fall back to probing.
+    """
+    global _known_relations, _known_relations_loaded_at
+
+    if _known_relations is not None and time.monotonic() - _known_relations_loaded_at < VIEW_CACHE_TTL_SECONDS:
+        return _known_relations
+
+    async with _known_relations_lock:
+        if _known_relations is not None and time.monotonic() - _known_relations_loaded_at < VIEW_CACHE_TTL_SECONDS:
+            return _known_relations
+        try:
+            async with get_async_connection() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute("""
+                        SELECT c.relname
+                        FROM pg_catalog.pg_class c
+                        JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+                        WHERE n.nspname = ANY(current_schemas(false))
+                          AND c.relkind IN ('r', 'v', 'm', 'p', 'f')
+                    """)
+                    rows = await cur.fetchall()
+            relations = frozenset(_normalize_view_name(row[0]) for row in rows)
+        except Exception as e:
+            logger.warning("Could not load database relations, probing every candidate view: %s", e)
+            return None
+
+        _known_relations = relations
+        _known_relations_loaded_at = time.monotonic()
+        _resolved_views.clear()
+        return _known_relations
+
+
+async def _ordered_candidates(possible_names: Tuple[str, ...]) -> List[str]:
+    """Drop candidates that don't exist and try the last view that returned data first."""
+    known = await _get_known_relations()
+    if known is None:
+        candidates = list(possible_names)
+    else:
+        candidates = [name for name in possible_names if _normalize_view_name(name) in known]
+
+    winner = _resolved_views.get(possible_names)
+    if winner in candidates:
+        candidates.remove(winner)
+        candidates.insert(0, winner)
+    return candidates
+
+
+def _remember_view(possible_names: Tuple[str, ...], view_name: str) -> None:
+    """Record the candidate that answered so the next lookup tries it first."""
+    _resolved_views[possible_names] = view_name
+
+
+def _isoformat_temporal_values(rows: List[Dict[str, Any]], description) -> List[Dict[str, Any]]:
+    """Convert date/time columns of dict rows to ISO strings in place."""
+    if not rows or not description:
+        return rows
+    temporal = [col.name for col in description if col.type_code in _TEMPORAL_TYPE_OIDS]
+    if temporal:
+        for row in rows:
+            for name in temporal:
+                value = row[name]
+                if value is not None:
+                    row[name] = value.isoformat()
+    return rows
+
+
+async def query_view(
+    view_name: str,
+    limit: int = 50,
+    filters: Optional[Dict[str, Any]] = None,
+    conn: Optional[AsyncConnection] = None,
+    columns: Optional[Sequence[str]] = None,
+    prepare: bool = True,
+    cache: bool = True,
+) -> List[Dict]:
     """
     Query a specific database view
     
     Args:
         view_name: Name of the view to query
         limit: Maximum number of rows to return
-        filters: Optional dictionary of filters (column: value)
+        filters: Optional dictionary of filters (column: value, or
+            column: (operator, value) with an operator from FILTER_OPERATORS)
+        conn: Optional connection to reuse (e.g. across candidate views)
+        columns: Optional columns to select; names missing from the view
+            are skipped, and all columns are returned if none match
+        prepare: Use a server-side prepared statement. Pass False for
+            lookups with skewed selectivity (e.g. by phone) so every call
+            is planned for its actual parameters
+        cache: Serve and store the result in the short-lived query cache.
+            Pass False for per-contact lookups and ad-hoc reads that
+            should always hit the database
     
     Returns:
         List of dictionaries with row data
     """
     try:
         # Validate view name to prevent SQL injection (only allow alphanumeric and underscores)
-        if not view_name.replace('_', '').replace('.', '').isalnum():
+        if not _VIEW_NAME_RE.fullmatch(view_name):
             raise ValueError(f"Invalid view name: {view_name}")
 
         if not _is_view_allowed(view_name):
             raise PermissionError(f"View '{view_name}' is not enabled for querying")
         
-        with get_connection() as conn:
-            with conn.cursor() as cur:
-                # Build query with proper parameterization
-                # View name is validated above, but we still use it carefully
-                query = f'SELECT * FROM "{view_name}"'
-                params = []
-                
-                # Add filters if provided
-                if filters:
-                    conditions = []
-                    for key, value in filters.items():
-                        # Validate column name
-                        if not key.replace('_', '').isalnum():
-                            raise ValueError(f"Invalid column name: {key}")
-                        conditions.append(f'"{key}" = %s')
-                        params.append(value)
-                    if conditions:
-                        query += " WHERE " + " AND ".join(conditions)
-                
-                query += " LIMIT %s"
-                params.append(limit)
-                
-                cur.execute(query, params)
-                results = cur.fetchall()
-                
-                # Get column names
-                columns = [desc[0] for desc in cur.description] if cur.description else []
-                
-                # Convert to list of dictionaries
-                rows = []
-                for row in results:
-                    row_dict = {}
-                    for i, col in enumerate(columns):
-                        value = row[i]
-                        # Convert datetime/timestamp to ISO format
-                        if hasattr(value, 'isoformat'):
-                            row_dict[col] = value.isoformat()
-                        else:
-                            row_dict[col] = value
-                    rows.append(row_dict)
-                
-                logger.info(f"Query executed on view '{view_name}': {len(rows)} rows returned")
-                return rows
+        # Build query with proper parameterization
+        # View name is validated above, but we still use it carefully
+        select_list = await _select_list(view_name, columns, conn) if columns else "*"
+        query = f'SELECT {select_list} FROM "{view_name}"'
+        params = []
+        
+        # Add filters if provided
+        if filters:
+            conditions = []
+            for key, value in filters.items():
+                # Validate column name
+                if not _COLUMN_NAME_RE.fullmatch(key):
+                    raise ValueError(f"Invalid column name: {key}")
+                operator = "="
+                if isinstance(value, tuple):
+                    operator, value = value
+                    if operator not in FILTER_OPERATORS:
+                        raise ValueError(f"Invalid filter operator: {operator}")
+                conditions.append(f'"{key}" {operator} %s')
+                params.append(value)
+            if conditions:
+                query += " WHERE " + " AND ".join(conditions)
+        
+        query += " LIMIT %s"
+        params.append(limit)
+        
+        cache_key = _query_cache_key(query, params) if cache else None
+        cached = _query_cache.get(cache_key) if cache_key else None
+        if cached is not None and cached[0] > time.monotonic():
+            _query_cache.move_to_end(cache_key)
+            return [dict(row) for row in cached[1]]
+        
+        if conn is None:
+            async with get_async_connection() as conn:
+                rows = await _fetch_view_rows(conn, query, params, prepare)
+        else:
+            try:
+                rows = await _fetch_view_rows(conn, query, params, prepare)
+            except Exception:
+                # A failed statement aborts the transaction; reset it so the
+                # caller can keep using the shared connection
+                with suppress(Exception):
+                    await conn.rollback()
+                raise
+        
+        logger.info(f"Query executed on view '{view_name}': {len(rows)} rows returned")
+        if cache_key:
+            # Cached rows are private copies; callers may mutate what they get
+            _query_cache[cache_key] = (
+                time.monotonic() + QUERY_CACHE_TTL_SECONDS,
+                tuple(dict(row) for row in rows),
+            )
+            _query_cache.move_to_end(cache_key)
+            while len(_query_cache) > QUERY_CACHE_MAX_ENTRIES:
+                _query_cache.popitem(last=False)
+        return rows
                 
     except Exception as e:
         # Only log as error if it's not a "relation does not exist" error
@@ -148,6 +414,66 @@ async def query_view(view_name: str, limit: int = 50, filters: Optional[Dict[str
         raise
 
 
+async def _select_list(
+    view_name: str, columns: Sequence[str], conn: Optional[AsyncConnection] = None
+) -> str:
+    """Quoted projection of the requested columns present in the view, or '*'."""
+    for column in columns:
+        if not _COLUMN_NAME_RE.fullmatch(column):
+            raise ValueError(f"Invalid column name: {column}")
+    try:
+        view_columns = await _get_view_columns(view_name, conn)
+    except Exception as e:
+        logger.debug(f"Could not read columns of '{view_name}': {e}")
+        return "*"
+    present = [
+        _quote_identifier(view_columns[column.lower()][0])
+        for column in dict.fromkeys(columns)
+        if column.lower() in view_columns
+    ]
+    return ", ".join(present) if present else "*"
+
+
+def _query_cache_key(query: str, params: List[Any]) -> Optional[Tuple[str, Tuple[Any, ...]]]:
+    """Cache key for a query, or None when a parameter isn't hashable."""
+    key = (query, tuple(params))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def _escape_like(text: str) -> str:
+    """Escape LIKE wildcards so user input matches literally."""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+async def _fetch_view_rows(
+    conn: AsyncConnection, query: str, params: List[Any], prepare: bool = True
+) -> List[Dict]:
+    async with conn.cursor(row_factory=dict_row) as cur:
+        # Same text for the same view and filter columns, so psycopg
+        # reuses the server-side prepared statement on this connection
+        await cur.execute(query, params, prepare=prepare)
+        return _isoformat_temporal_values(await cur.fetchall(), cur.description)
+
+
+@asynccontextmanager
+async def _probe_connection():
+    """
+    Connection shared by a helper's candidate probes. Yields None when the
+    pool can't provide one, so each probe fails (and is logged) on its own.
+    """
+    async with AsyncExitStack() as stack:
+        try:
+            conn = await stack.enter_async_context(get_async_connection())
+        except Exception as e:
+            logger.warning("Could not get a database connection: %s", e)
+            conn = None
+        yield conn
+
+
 async def get_products(search_term: Optional[str] = None, limit: int = 20) -> List[Dict]:
     """
     Get products from database (try common view/table names)
@@ -159,33 +485,28 @@ async def get_products(search_term: Optional[str] = None, limit: int = 20) -> Li
     Returns:
         List of products
     """
-    # Try common view/table names for products
-    possible_names = [
-        'v_products', 'view_products', 'products_view',
-        'productos', 'v_productos',
-        'products', 'product'
-    ]
-
-    possible_names = _filter_allowed_views(possible_names)
+    possible_names = PRODUCT_VIEWS
     if not possible_names:
         logger.warning("No enabled views configured for products queries")
         return []
     
-    for view_name in possible_names:
-        try:
-            filters = {}
-            if search_term:
-                # Try to search in name or description
-                filters = {'name': search_term}  # This might need adjustment based on actual schema
-                # Note: For LIKE queries, you'd need to modify the query building
+    candidates = await _ordered_candidates(possible_names)
+    async with _probe_connection() as conn:
+        for view_name in candidates:
+            try:
+                filters = None
+                if search_term:
+                    # Case-insensitive partial match on the product name
+                    filters = {'name': ('ILIKE', f"%{_escape_like(search_term)}%")}
             
-            results = await query_view(view_name, limit=limit, filters=filters if not search_term else None)
-            if results:
-                logger.info(f"Found products in view '{view_name}'")
-                return results
-        except Exception as e:
-            logger.debug(f"View '{view_name}' not found or error: {e}")
-            continue
+                results = await query_view(view_name, limit=limit, filters=filters, conn=conn)
+                if results:
+                    _remember_view(possible_names, view_name)
+                    logger.info(f"Found products in view '{view_name}'")
+                    return results
+            except Exception as e:
+                logger.debug(f"View '{view_name}' not found or error: {e}")
+                continue
     
     logger.warning("No products view found")
     return []
@@ -202,28 +523,27 @@ async def get_orders_by_phone(phone_number: str, limit: int = 10) -> List[Dict]:
     Returns:
         List of orders
     """
-    # Try common view/table names for orders
-    possible_names = [
-        'v_orders', 'view_orders', 'orders_view',
-        'pedidos', 'v_pedidos',
-        'orders', 'order'
-    ]
-
-    possible_names = _filter_allowed_views(possible_names)
+    possible_names = ORDER_VIEWS
     if not possible_names:
         logger.warning("No enabled views configured for order queries")
         return []
     
-    for view_name in possible_names:
-        try:
-            filters = {'phone': phone_number}
-            results = await query_view(view_name, limit=limit, filters=filters)
-            if results:
-                logger.info(f"Found orders in view '{view_name}' for {phone_number}")
-                return results
-        except Exception as e:
-            logger.debug(f"View '{view_name}' not found or error: {e}")
-            continue
+    candidates = await _ordered_candidates(possible_names)
+    async with _probe_connection() as conn:
+        for view_name in candidates:
+            try:
+                filters = {'phone': phone_number}
+                results = await query_view(
+                    view_name, limit=limit, filters=filters, conn=conn,
+                    columns=ORDER_SUMMARY_COLUMNS, prepare=False, cache=False,
+                )
+                if results:
+                    _remember_view(possible_names, view_name)
+                    logger.info(f"Found orders in view '{view_name}' for {phone_number}")
+                    return results
+            except Exception as e:
+                logger.debug(f"View '{view_name}' not found or error: {e}")
+                continue
     
     logger.warning(f"No orders found for phone {phone_number}")
     return []
@@ -239,26 +559,23 @@ async def get_order_by_id(order_id: str) -> Optional[Dict]:
     Returns:
         Order dictionary or None
     """
-    possible_names = [
-        'v_orders', 'view_orders', 'orders_view',
-        'pedidos', 'v_pedidos',
-        'orders', 'order'
-    ]
-
-    possible_names = _filter_allowed_views(possible_names)
+    possible_names = ORDER_VIEWS
     if not possible_names:
         logger.warning("No enabled views configured for order detail queries")
         return None
     
-    for view_name in possible_names:
-        try:
-            filters = {'id': order_id}
-            results = await query_view(view_name, limit=1, filters=filters)
-            if results:
-                return results[0]
-        except Exception as e:
-            logger.debug(f"View '{view_name}' not found or error: {e}")
-            continue
+    candidates = await _ordered_candidates(possible_names)
+    async with _probe_connection() as conn:
+        for view_name in candidates:
+            try:
+                filters = {'id': order_id}
+                results = await query_view(view_name, limit=1, filters=filters, conn=conn)
+                if results:
+                    _remember_view(possible_names, view_name)
+                    return results[0]
+            except Exception as e:
+                logger.debug(f"View '{view_name}' not found or error: {e}")
+                continue
     
     return None
 
@@ -273,30 +590,27 @@ async def get_stock_info(product_id: Optional[str] = None) -> List[Dict]:
     Returns:
         List of stock information
     """
-    possible_names = [
-        'v_stock', 'view_stock', 'stock_view',
-        'inventario', 'v_inventario',
-        'stock', 'inventory'
-    ]
-
-    possible_names = _filter_allowed_views(possible_names)
+    possible_names = STOCK_VIEWS
     if not possible_names:
         logger.warning("No enabled views configured for stock queries")
         return []
     
-    for view_name in possible_names:
-        try:
-            filters = {}
-            if product_id:
-                filters = {'product_id': product_id}
+    candidates = await _ordered_candidates(possible_names)
+    async with _probe_connection() as conn:
+        for view_name in candidates:
+            try:
+                filters = {}
+                if product_id:
+                    filters = {'product_id': product_id}
             
-            results = await query_view(view_name, limit=100, filters=filters if product_id else None)
-            if results:
-                logger.info(f"Found stock info in view '{view_name}'")
-                return results
-        except Exception as e:
-            logger.debug(f"View '{view_name}' not found or error: {e}")
-            continue
+                results = await query_view(view_name, limit=100, filters=filters if product_id else None, conn=conn)
+                if results:
+                    _remember_view(possible_names, view_name)
+                    logger.info(f"Found stock info in view '{view_name}'")
+                    return results
+            except Exception as e:
+                logger.debug(f"View '{view_name}' not found or error: {e}")
+                continue
     
     logger.warning("No stock view found")
     return []
@@ -312,26 +626,26 @@ async def get_customer_info(phone_number: str) -> Optional[Dict]:
     Returns:
         Customer dictionary or None
     """
-    possible_names = [
-        'v_customers', 'view_customers', 'customers_view',
-        'clientes', 'v_clientes',
-        'customers', 'customer'
-    ]
-
-    possible_names = _filter_allowed_views(possible_names)
+    possible_names = CUSTOMER_VIEWS
     if not possible_names:
         logger.warning("No enabled views configured for customer queries")
         return None
     
-    for view_name in possible_names:
-        try:
-            filters = {'phone': phone_number}
-            results = await query_view(view_name, limit=1, filters=filters)
-            if results:
-                return results[0]
-        except Exception as e:
-            logger.debug(f"View '{view_name}' not found or error: {e}")
-            continue
+    candidates = await _ordered_candidates(possible_names)
+    async with _probe_connection() as conn:
+        for view_name in candidates:
+            try:
+                filters = {'phone': phone_number}
+                results = await query_view(
+                    view_name, limit=1, filters=filters, conn=conn,
+                    columns=CUSTOMER_SUMMARY_COLUMNS, prepare=False, cache=False,
+                )
+                if results:
+                    _remember_view(possible_names, view_name)
+                    return results[0]
+            except Exception as e:
+                logger.debug(f"View '{view_name}' not found or error: {e}")
+                continue
     
     return None
 
@@ -343,28 +657,38 @@ async def list_available_views() -> List[str]:
     Returns:
         List of view names
     """
+    global _available_views
+    if _available_views is not None and time.monotonic() - _available_views[0] < VIEW_CACHE_TTL_SECONDS:
+        return list(_available_views[1])
+
     try:
-        with get_connection() as conn:
-            with conn.cursor() as cur:
+        async with get_async_connection() as conn:
+            async with conn.cursor() as cur:
                 # PostgreSQL query to get all views
-                cur.execute("""
+                await cur.execute("""
                     SELECT table_name 
                     FROM information_schema.views 
                     WHERE table_schema = 'public'
                     ORDER BY table_name
                 """)
-                results = cur.fetchall()
+                results = await cur.fetchall()
                 views = [row[0] for row in results]
                 if ENABLED_VIEWS:
                     views = [view for view in views if _is_view_allowed(view)]
                 logger.info(f"Found {len(views)} views in database")
+                _available_views = (time.monotonic(), tuple(views))
                 return views
     except Exception as e:
         logger.error(f"Error listing views: {e}")
         return []
 
 
-async def get_custom_view_data(view_name: str, filters: Optional[Dict] = None, limit: int = 50) -> List[Dict]:
+async def get_custom_view_data(
+    view_name: str,
+    filters: Optional[Dict] = None,
+    limit: int = 50,
+    cache: bool = True,
+) -> List[Dict]:
     """
     Query a custom view with optional filters
     
@@ -372,11 +696,12 @@ async def get_custom_view_data(view_name: str, filters: Optional[Dict] = None, l
         view_name: Name of the view
         filters: Optional filters
         limit: Maximum rows
+        cache: Allow a result from the short-lived query cache
     
     Returns:
         List of dictionaries
     """
-    return await query_view(view_name, limit=limit, filters=filters)
+    return await query_view(view_name, limit=limit, filters=filters, cache=cache)
 
 
 async def get_monthly_sales_costs(limit: int = 100) -> List[Dict]:
@@ -398,29 +723,16 @@ async def get_monthly_sales_costs(limit: int = 100) -> List[Dict]:
         return []
 
     try:
-        with get_connection() as conn:
-            with conn.cursor() as cur:
+        async with get_async_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
                 query = f'''
                     SELECT month, revenue, costs, profit, margin_pct 
                     FROM "{legacy_view}"
                     ORDER BY month DESC
                     LIMIT %s
                 '''
-                cur.execute(query, (limit,))
-                results = cur.fetchall()
-                
-                columns = [desc[0] for desc in cur.description] if cur.description else []
-                
-                rows = []
-                for row in results:
-                    row_dict = {}
-                    for i, col in enumerate(columns):
-                        value = row[i]
-                        if hasattr(value, 'isoformat'):
-                            row_dict[col] = value.isoformat()
-                        else:
-                            row_dict[col] = value
-                    rows.append(row_dict)
+                await cur.execute(query, (limit,))
+                rows = _isoformat_temporal_values(await cur.fetchall(), cur.description)
                 
                 if rows:
                     logger.info(f"Found monthly sales and costs in view '{legacy_view}': {len(rows)} records")
@@ -434,30 +746,217 @@ async def get_monthly_sales_costs(limit: int = 100) -> List[Dict]:
 
 
 async def _aggregate_sales_dashboard(view_name: str, limit: int) -> List[Dict]:
+    """
+    Monthly revenue, costs and order counts from the sales dashboard view.
+
+    The grouping runs in PostgreSQL so only one row per month comes back;
+    the column aliases are resolved against the view's actual columns.
+    """
+    try:
+        columns = await _get_view_columns(view_name)
+        query = _build_monthly_sales_query(view_name, columns)
+        if query is None:
+            return await _aggregate_sales_rows(view_name, limit, columns)
+
+        async with get_async_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, (limit,))
+                rows = await cur.fetchall()
+    except Exception as exc:
+        logger.error("Error aggregating '%s': %s", view_name, exc)
+        return []
+
+    if not rows:
+        logger.warning("View '%s' exists but returned no rows for aggregation", view_name)
+        return []
+
+    summaries = []
+    for month, revenue, product_cost, shipping_cost, orders in rows:
+        revenue = float(revenue)
+        costs = float(product_cost) + float(shipping_cost)
+        profit = revenue - costs
+        summaries.append({
+            "month": month.isoformat(),
+            "revenue": revenue,
+            "costs": costs,
+            "profit": profit,
+            "margin_pct": (profit / revenue * 100) if revenue else None,
+            "orders": orders,
+        })
+    return summaries
+
+
+async def _get_view_columns(
+    view_name: str, conn: Optional[AsyncConnection] = None
+) -> Dict[str, Tuple[str, str]]:
+    """
+    Map lowercased column names of a view to (actual name, data type), cached per view.
+
+    Runs on the caller's connection when given (so a probe holding one
+    doesn't wait on the pool for a second), otherwise on a pooled one.
+    """
+    cached = _view_columns_cache.get(view_name)
+    if cached and time.monotonic() - cached[0] < VIEW_CACHE_TTL_SECONDS:
+        return cached[1]
+
+    if conn is None:
+        async with get_async_connection() as conn:
+            rows = await _fetch_view_columns(conn, view_name)
+    else:
+        try:
+            rows = await _fetch_view_columns(conn, view_name)
+        except Exception:
+            # Keep the shared connection usable for the caller's next query
+            with suppress(Exception):
+                await conn.rollback()
+            raise
+    columns = {name.lower(): (name, data_type) for name, data_type in rows}
+    if columns:
+        _view_columns_cache[view_name] = (time.monotonic(), columns)
+    return columns
+
+
+async def _fetch_view_columns(conn: AsyncConnection, view_name: str) -> List[Tuple[str, str]]:
+    async with conn.cursor() as cur:
+        await cur.execute(
+            """
+            SELECT column_name, data_type
+            FROM information_schema.columns
+            WHERE table_name = %s
+              AND table_schema = ANY(current_schemas(false))
+            ORDER BY ordinal_position
+            """,
+            (view_name,),
+        )
+        return await cur.fetchall()
+
+
+def _quote_identifier(name: str) -> str:
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+def _coalesce_columns(columns: Dict[str, Tuple[str, str]], candidates: Tuple[str, ...], cast: str) -> Optional[str]:
+    """SQL picking the first non-null of the candidate columns present in the view."""
+    present = [
+        f"{_quote_identifier(columns[key][0])}::{cast}"
+        for key in candidates
+        if key in columns
+    ]
+    if not present:
+        return None
+    if len(present) == 1:
+        return present[0]
+    return f"COALESCE({', '.join(present)})"
+
+
+def _numeric_expression(columns: Dict[str, Tuple[str, str]], candidates: Tuple[str, ...]) -> Optional[str]:
+    """
+    SQL for the first non-null of the candidate metric columns as numeric,
+    "0" when none is present, or None when one has a type SQL can't sum.
+    """
+    present = []
+    for key in candidates:
+        if key not in columns:
+            continue
+        name, data_type = columns[key]
+        column = _quote_identifier(name)
+        if data_type in _NUMERIC_COLUMN_TYPES:
+            present.append(f"{column}::numeric")
+        elif data_type in _TEXT_COLUMN_TYPES:
+            # Same as the Python path: a blank value counts as 0 and doesn't
+            # fall through to the next alias
+            present.append(
+                f"CASE WHEN {column} IS NULL THEN NULL "
+                f"ELSE COALESCE(NULLIF(btrim({column}), '')::numeric, 0) END"
+            )
+        else:
+            return None
+    if not present:
+        return "0"
+    if len(present) == 1:
+        return present[0]
+    return f"COALESCE({', '.join(present)})"
+
+
+def _build_monthly_sales_query(view_name: str, columns: Dict[str, Tuple[str, str]]) -> Optional[str]:
+    """
+    Build the GROUP BY month query for the sales dashboard, or None when the
+    view needs the Python aggregation instead: a day alias that isn't a
+    date/timestamp (text dates are parsed in Python, in alias order) or a
+    metric column of a type other than numeric or text.
+    """
+    day_keys = [key for key in SALES_DAY_COLUMNS if key in columns]
+    if not day_keys or any(columns[key][1] not in _DATE_COLUMN_TYPES for key in day_keys):
+        return None
+    day = _coalesce_columns(columns, SALES_DAY_COLUMNS, "date")
+
+    revenue = _numeric_expression(columns, SALES_REVENUE_COLUMNS)
+    product_cost = _numeric_expression(columns, SALES_COST_COLUMNS)
+    shipping_cost = _numeric_expression(columns, SALES_SHIPPING_COLUMNS)
+    if revenue is None or product_cost is None or shipping_cost is None:
+        return None
+    order_id = _coalesce_columns(columns, SALES_ORDER_COLUMNS, "text")
+    orders = f"COUNT(DISTINCT NULLIF(btrim({order_id}), ''))" if order_id else "0"
+
+    return f'''
+        SELECT
+            date_trunc('month', {day})::date AS month,
+            COALESCE(SUM({revenue}), 0) AS revenue,
+            COALESCE(SUM({product_cost}), 0) AS product_cost,
+            COALESCE(SUM({shipping_cost}), 0) AS shipping_cost,
+            {orders} AS orders
+        FROM "{view_name}"
+        WHERE {day} IS NOT NULL
+        GROUP BY 1
+        ORDER BY 1 DESC
+        LIMIT %s
+    '''
+
+
+async def _aggregate_sales_rows(
+    view_name: str,
+    limit: int,
+    view_columns: Optional[Dict[str, Tuple[str, str]]] = None,
+) -> List[Dict]:
+    """Aggregate the dashboard in Python when its day column isn't a date type."""
+    select_list, order_by = "*", "1"
+    if view_columns:
+        # Only fetch the alias columns the aggregation reads, still ordered
+        # by the view's first column
+        wanted = [
+            _quote_identifier(view_columns[key][0])
+            for key in view_columns
+            if key in _SALES_COLUMN_SET
+        ]
+        if wanted:
+            select_list = ", ".join(wanted)
+            order_by = _quote_identifier(next(iter(view_columns.values()))[0])
+
     try:
-        with get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
+        async with get_async_connection() as conn:
+            # Server-side cursor: rows stream in batches instead of all 5000 at once
+            async with conn.cursor(name="sales_dashboard_rows") as cur:
+                cur.itersize = 500
+                await cur.execute(
                     f'''
-                    SELECT *
+                    SELECT {select_list}
                     FROM "{view_name}"
-                    ORDER BY 1 DESC
+                    ORDER BY {order_by} DESC
                     LIMIT %s
                     ''',
                     (5000,),
                 )
-                rows = cur.fetchall()
-                if not rows or not cur.description:
+                if not cur.description:
                     logger.warning("View '%s' exists but returned no rows for aggregation", view_name)
                     return []
                 
                 columns = [desc[0].lower() for desc in cur.description]
                 monthly_data: Dict[date, Dict[str, Any]] = {}
                 
-                for record in rows:
-                    row_dict = {columns[idx]: record[idx] for idx in range(len(columns))}
+                async for record in cur:
+                    row_dict = dict(zip(columns, record))
                     
-                    day_value = _get_first_value(row_dict, ["dia", "fecha", "day"])
+                    day_value = _get_first_value(row_dict, SALES_DAY_COLUMNS)
                     day = _parse_date_value(day_value)
                     if not day:
                         continue
@@ -475,42 +974,18 @@ async def _aggregate_sales_dashboard(view_name: str, limit: int) -> List[Dict]:
                     )
                     
                     revenue = float(
-                        _get_first_value(
-                            row_dict,
-                            ["precio_venta", "revenue_bruto", "revenue", "precio_total", "precio"],
-                            0.0,
-                        )
+                        _get_first_value(row_dict, SALES_REVENUE_COLUMNS, 0.0)
                         or 0.0
                     )
                     shipping = float(
-                        _get_first_value(
-                            row_dict,
-                            ["costo_envio", "shipping_cost", "envio_total"],
-                            0.0,
-                        )
+                        _get_first_value(row_dict, SALES_SHIPPING_COLUMNS, 0.0)
                         or 0.0
                     )
                     unit_cost = float(
-                        _get_first_value(
-                            row_dict,
-                            ["costo_unitario", "unit_cost", "costo", "costo_producto"],
-                            0.0,
-                        )
+                        _get_first_value(row_dict, SALES_COST_COLUMNS, 0.0)
                         or 0.0
                     )
-                    order_id = _get_first_value(
-                        row_dict,
-                        [
-                            "order_id",
-                            "orden_id",
-                            "id_orden",
-                            "order",
-                            "id_order",
-                            "orderid",
-                            "order_number",
-                            "numero_orden",
-                        ],
-                    )
+                    order_id = _get_first_value(row_dict, SALES_ORDER_COLUMNS)
                     
                     bucket["revenue"] += revenue
                     bucket["product_cost"] += unit_cost
@@ -520,6 +995,10 @@ async def _aggregate_sales_dashboard(view_name: str, limit: int) -> List[Dict]:
                         if text_id:
                             bucket["orders"].add(text_id)
                 
+                if not monthly_data:
+                    logger.warning("View '%s' exists but returned no rows for aggregation", view_name)
+                    return []
+                
                 summaries = []
                 for month_key, bucket in monthly_data.items():
                     revenue = bucket["revenue"]
@@ -551,15 +1030,15 @@ async def get_sales_dashboard_date_range(
         return (None, None)
 
     try:
-        with get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
+        async with get_async_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
                     f'''
                     SELECT MIN(dia) AS min_day, MAX(dia) AS max_day
                     FROM "{view_name}"
                     '''
                 )
-                row = cur.fetchone()
+                row = await cur.fetchone()
                 if row:
                     return (
                         _parse_date_value(row[0]),
@@ -586,29 +1065,23 @@ async def get_sales_report(limit: int = 100) -> List[Dict]:
     if monthly_data:
         return monthly_data
     
-    # Then try other common view names
-    possible_names = [
-        'v_sales_report', 'view_sales_report', 'sales_report_view',
-        'v_ventas', 'view_ventas', 'ventas_view',
-        'v_sales', 'view_sales', 'sales_view',
-        'v_revenue', 'view_revenue', 'revenue_view',
-        'v_facturacion', 'facturacion_view'
-    ]
-
-    possible_names = _filter_allowed_views(possible_names)
+    possible_names = SALES_REPORT_VIEWS
     if not possible_names:
         logger.warning("No enabled views configured for sales reports")
         return []
     
-    for view_name in possible_names:
-        try:
-            results = await query_view(view_name, limit=limit)
-            if results:
-                logger.info(f"Found sales report in view '{view_name}'")
-                return results
-        except Exception as e:
-            logger.debug(f"View '{view_name}' not found or error: {e}")
-            continue
+    candidates = await _ordered_candidates(possible_names)
+    async with _probe_connection() as conn:
+        for view_name in candidates:
+            try:
+                results = await query_view(view_name, limit=limit, conn=conn)
+                if results:
+                    _remember_view(possible_names, view_name)
+                    logger.info(f"Found sales report in view '{view_name}'")
+                    return results
+            except Exception as e:
+                logger.debug(f"View '{view_name}' not found or error: {e}")
+                continue
     
     logger.warning("No sales report view found")
     return []
@@ -624,30 +1097,23 @@ async def get_marketing_report(limit: int = 100) -> List[Dict]:
     Returns:
         List of marketing records
     """
-    possible_names = [
-        'v_marketing_performance_analysis',
-        'v_marketing_report', 'view_marketing_report', 'marketing_report_view',
-        'v_marketing', 'view_marketing', 'marketing_view',
-        'v_ads', 'view_ads', 'ads_view',
-        'v_publicidad', 'view_publicidad', 'publicidad_view',
-        'v_campaigns', 'view_campaigns', 'campaigns_view',
-        'v_campanas', 'view_campanas', 'campanas_view'
-    ]
-
-    possible_names = _filter_allowed_views(possible_names)
+    possible_names = MARKETING_VIEWS
     if not possible_names:
         logger.warning("No enabled views configured for marketing reports")
         return []
     
-    for view_name in possible_names:
-        try:
-            results = await query_view(view_name, limit=limit)
-            if results:
-                logger.info(f"Found marketing report in view '{view_name}'")
-                return results
-        except Exception as e:
-            logger.debug(f"View '{view_name}' not found or error: {e}")
-            continue
+    candidates = await _ordered_candidates(possible_names)
+    async with _probe_connection() as conn:
+        for view_name in candidates:
+            try:
+                results = await query_view(view_name, limit=limit, conn=conn)
+                if results:
+                    _remember_view(possible_names, view_name)
+                    logger.info(f"Found marketing report in view '{view_name}'")
+                    return results
+            except Exception as e:
+                logger.debug(f"View '{view_name}' not found or error: {e}")
+                continue
     
     logger.warning("No marketing report view found")
     return []
@@ -663,27 +1129,23 @@ async def get_top_products(limit: int = 20) -> List[Dict]:
     Returns:
         List of top products with sales data
     """
-    possible_names = [
-        'v_top_products', 'view_top_products', 'top_products_view',
-        'v_productos_mas_vendidos', 'view_productos_mas_vendidos',
-        'v_best_sellers', 'view_best_sellers', 'best_sellers_view',
-        'v_product_sales', 'view_product_sales', 'product_sales_view'
-    ]
-
-    possible_names = _filter_allowed_views(possible_names)
+    possible_names = TOP_PRODUCT_VIEWS
     if not possible_names:
         logger.warning("No enabled views configured for top products analytics")
         return []
     
-    for view_name in possible_names:
-        try:
-            results = await query_view(view_name, limit=limit)
-            if results:
-                logger.info(f"Found top products in view '{view_name}'")
-                return results
-        except Exception as e:
-            # Silent failure - these views don't exist, that's expected
-            continue
+    candidates = await _ordered_candidates(possible_names)
+    async with _probe_connection() as conn:
+        for view_name in candidates:
+            try:
+                results = await query_view(view_name, limit=limit, conn=conn)
+                if results:
+                    _remember_view(possible_names, view_name)
+                    logger.info(f"Found top products in view '{view_name}'")
+                    return results
+            except Exception as e:
+                # Silent failure - these views don't exist, that's expected
+                continue
     
     logger.debug("No top products view found - use v_sales_dashboard_planilla instead")
     return []
@@ -699,28 +1161,23 @@ async def get_financial_report(limit: int = 100) -> List[Dict]:
     Returns:
         List of financial records
     """
-    possible_names = [
-        'v_financial_report', 'view_financial_report', 'financial_report_view',
-        'v_financiero', 'view_financiero', 'financiero_view',
-        'v_ingresos_gastos', 'view_ingresos_gastos', 'ingresos_gastos_view',
-        'v_expenses', 'view_expenses', 'expenses_view',
-        'v_gastos', 'view_gastos', 'gastos_view'
-    ]
-
-    possible_names = _filter_allowed_views(possible_names)
+    possible_names = FINANCIAL_VIEWS
     if not possible_names:
         logger.warning("No enabled views configured for financial reports")
         return []
     
-    for view_name in possible_names:
-        try:
-            results = await query_view(view_name, limit=limit)
-            if results:
-                logger.info(f"Found financial report in view '{view_name}'")
-                return results
-        except Exception as e:
-            logger.debug(f"View '{view_name}' not found or error: {e}")
-            continue
+    candidates = await _ordered_candidates(possible_names)
+    async with _probe_connection() as conn:
+        for view_name in candidates:
+            try:
+                results = await query_view(view_name, limit=limit, conn=conn)
+                if results:
+                    _remember_view(possible_names, view_name)
+                    logger.info(f"Found financial report in view '{view_name}'")
+                    return results
+            except Exception as e:
+                logger.debug(f"View '{view_name}' not found or error: {e}")
+                continue
     
     logger.warning("No financial report view found")
     return []
@@ -736,28 +1193,23 @@ async def get_general_analytics(limit: int = 100) -> List[Dict]:
     Returns:
         List of analytics records
     """
-    possible_names = [
-        'v_analytics', 'view_analytics', 'analytics_view',
-        'v_dashboard', 'view_dashboard', 'dashboard_view',
-        'v_metricas', 'view_metricas', 'metricas_view',
-        'v_estadisticas', 'view_estadisticas', 'estadisticas_view',
-        'v_kpis', 'view_kpis', 'kpis_view'
-    ]
-
-    possible_names = _filter_allowed_views(possible_names)
+    possible_names = ANALYTICS_VIEWS
     if not possible_names:
         logger.warning("No enabled views configured for general analytics")
         return []
     
-    for view_name in possible_names:
-        try:
-            results = await query_view(view_name, limit=limit)
-            if results:
-                logger.info(f"Found analytics in view '{view_name}'")
-                return results
-        except Exception as e:
-            logger.debug(f"View '{view_name}' not found or error: {e}")
-            continue
+    candidates = await _ordered_candidates(possible_names)
+    async with _probe_connection() as conn:
+        for view_name in candidates:
+            try:
+                results = await query_view(view_name, limit=limit, conn=conn)
+                if results:
+                    _remember_view(possible_names, view_name)
+                    logger.info(f"Found analytics in view '{view_name}'")
+                    return results
+            except Exception as e:
+                logger.debug(f"View '{view_name}' not found or error: {e}")
+                continue
     
     logger.warning("No analytics view found")
     return []
@@ -1,9 +1,10 @@
 """
 Database connection management
 """
+import asyncio
 import psycopg
-from psycopg_pool import ConnectionPool
-from contextlib import contextmanager
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
+from contextlib import asynccontextmanager, contextmanager
 import logging
 
 from app.config import get_settings
@@ -14,6 +15,10 @@ settings = get_settings()
 # Connection pool
 _pool: ConnectionPool = None
 
+# Async connection pool, opened lazily on the running event loop
+_async_pool: AsyncConnectionPool = None
+_async_pool_lock = asyncio.Lock()
+
 
 def get_pool() -> ConnectionPool:
     """Get or create connection pool"""
@@ -37,4 +42,41 @@ def get_connection():
         yield conn
 
 
+async def get_async_pool() -> AsyncConnectionPool:
+    """Get or create the async connection pool"""
+    global _async_pool
+    if _async_pool is None:
+        async with _async_pool_lock:
+            if _async_pool is None:
+                kwargs = {}
+                if settings.db_plan_cache_mode:
+                    kwargs["options"] = f"-c plan_cache_mode={settings.db_plan_cache_mode}"
+                pool = AsyncConnectionPool(
+                    conninfo=settings.database_url,
+                    min_size=2,
+                    max_size=10,
+                    timeout=30,
+                    kwargs=kwargs,
+                    open=False
+                )
+                await pool.open()
+                _async_pool = pool
+                logger.info("✅ Async database connection pool created")
+    return _async_pool
+
+
+@asynccontextmanager
+async def get_async_connection():
+    """Get async database connection from pool"""
+    pool = await get_async_pool()
+    async with pool.connection() as conn:
+        yield conn
+
 
+async def close_async_pool() -> None:
+    """Close the async connection pool if it was opened"""
+    global _async_pool
+    if _async_pool is not None:
+        await _async_pool.close()
+        _async_pool = None
+        logger.info("Async database connection pool closed")
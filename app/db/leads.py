@@ -1,11 +1,16 @@
 """
 Leads and contacts management
+
+Queries use the sync psycopg pool; each runs in a worker thread via
+asyncio.to_thread so the event loop isn't blocked while it waits on the DB.
 """
+import asyncio
 import logging
 from typing import Optional, List, Dict
 from datetime import datetime
 
 from app.db.connection import get_connection
+from app.db.queries import save_conversations_bulk
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +26,10 @@ async def get_or_create_lead(phone_number: str, customer_name: str = None) -> Di
     Returns:
         Lead dictionary
     """
+    return await asyncio.to_thread(_get_or_create_lead_sync, phone_number, customer_name)
+
+
+def _get_or_create_lead_sync(phone_number: str, customer_name: str = None) -> Dict:
     try:
         with get_connection() as conn:
             with conn.cursor() as cur:
@@ -108,6 +117,10 @@ async def update_lead_status(phone_number: str, lead_status: str, notes: str = N
     Returns:
         True if successful
     """
+    return await asyncio.to_thread(_update_lead_status_sync, phone_number, lead_status, notes)
+
+
+def _update_lead_status_sync(phone_number: str, lead_status: str, notes: str = None) -> bool:
     try:
         valid_statuses = ['potential_client', 'bad_lead', 'customer', 'unknown']
         if lead_status not in valid_statuses:
@@ -148,6 +161,10 @@ async def get_leads_by_status(lead_status: Optional[str] = None, limit: int = 50
     Returns:
         List of leads
     """
+    return await asyncio.to_thread(_get_leads_by_status_sync, lead_status, limit)
+
+
+def _get_leads_by_status_sync(lead_status: Optional[str] = None, limit: int = 50) -> List[Dict]:
     try:
         with get_connection() as conn:
             with conn.cursor() as cur:
@@ -205,6 +222,10 @@ async def get_conversation_history(phone_number: str, limit: int = 50) -> List[D
     Returns:
         List of conversation messages in chronological order
     """
+    return await asyncio.to_thread(_get_conversation_history_sync, phone_number, limit)
+
+
+def _get_conversation_history_sync(phone_number: str, limit: int = 50) -> List[Dict]:
     try:
         with get_connection() as conn:
             with conn.cursor() as cur:
@@ -269,61 +290,30 @@ async def import_conversation_batch(
         # First ensure lead exists
         await get_or_create_lead(phone_number, customer_name)
         
-        imported_count = 0
-        with get_connection() as conn:
-            with conn.cursor() as cur:
-                for conv in conversations:
-                    message_text = conv.get('message', '')
-                    response_text = conv.get('response', '')
-                    timestamp = conv.get('timestamp')
-                    direction = conv.get('direction', 'incoming')
-                    message_id = conv.get('message_id')
-                    
-                    if not message_text and not response_text:
-                        continue
-                    
-                    # Check if already exists (by message_id if available)
-                    if message_id:
-                        cur.execute("""
-                            SELECT id FROM whatsapp_conversations 
-                            WHERE message_id = %s
-                        """, (message_id,))
-                        if cur.fetchone():
-                            continue  # Skip duplicates
-                    
-                    # Insert conversation
-                    if timestamp:
-                        cur.execute("""
-                            INSERT INTO whatsapp_conversations 
-                            (phone_number, customer_name, message_text, response_text, 
-                             message_type, direction, message_id, created_at, imported)
-                            VALUES (%s, %s, %s, %s, 'text', %s, %s, %s, TRUE)
-                        """, (phone_number, customer_name, message_text, response_text, 
-                              direction, message_id, timestamp))
-                    else:
-                        cur.execute("""
-                            INSERT INTO whatsapp_conversations 
-                            (phone_number, customer_name, message_text, response_text, 
-                             message_type, direction, message_id, imported)
-                            VALUES (%s, %s, %s, %s, 'text', %s, %s, TRUE)
-                        """, (phone_number, customer_name, message_text, response_text, 
-                              direction, message_id))
-                    
-                    imported_count += 1
-                
-                conn.commit()
-                
-                # Update lead's last interaction
-                cur.execute("""
-                    UPDATE whatsapp_leads
-                    SET last_interaction_at = (
-                        SELECT MAX(created_at) FROM whatsapp_conversations 
-                        WHERE phone_number = %s
-                    ),
-                    updated_at = NOW()
-                    WHERE phone_number = %s
-                """, (phone_number, phone_number))
-                conn.commit()
+        rows = []
+        for conv in conversations:
+            message_text = conv.get('message', '')
+            response_text = conv.get('response', '')
+            
+            if not message_text and not response_text:
+                continue
+            
+            rows.append((
+                phone_number,
+                customer_name,
+                message_text,
+                response_text,
+                'text',
+                conv.get('direction', 'incoming'),
+                conv.get('message_id'),
+                conv.get('timestamp'),
+                True,
+            ))
+        
+        # Single COPY round-trip; duplicates (by message_id) are skipped
+        imported_count = await save_conversations_bulk(rows) if rows else 0
+        
+        await asyncio.to_thread(_touch_lead_last_interaction_sync, phone_number)
         
         logger.info(f"Imported {imported_count} conversations for {phone_number}")
         return imported_count
@@ -334,3 +324,18 @@ async def import_conversation_batch(
         traceback.print_exc()
         return 0
 
+
+def _touch_lead_last_interaction_sync(phone_number: str) -> None:
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            # Update lead's last interaction
+            cur.execute("""
+                UPDATE whatsapp_leads
+                SET last_interaction_at = (
+                    SELECT MAX(created_at) FROM whatsapp_conversations 
+                    WHERE phone_number = %s
+                ),
+                updated_at = NOW()
+                WHERE phone_number = %s
+            """, (phone_number, phone_number))
+            conn.commit()
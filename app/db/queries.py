@@ -2,13 +2,93 @@
 Database queries for appointments and conversations
 """
 import logging
+import time
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import Any, AsyncIterator, Iterable, List, Dict, Optional, Sequence
 
-from app.db.connection import get_connection
+from psycopg import AsyncPipeline
+
+from app.db.connection import get_async_connection
 
 logger = logging.getLogger(__name__)
 
+# Partial unique index on message_id (run_migrations.py / create_leads_table.sql).
+# Until it exists, ON CONFLICT (message_id) is rejected by Postgres, so the
+# saves fall back to checking for the message_id first.
+MESSAGE_ID_INDEX = "whatsapp_conversations_message_id_uk"
+MESSAGE_ID_INDEX_RECHECK_SECONDS = 300
+
+# (checked_at, exists); a positive answer is kept for the life of the process
+_message_id_index_state: Optional[tuple] = None
+
+APPOINTMENTS_BETWEEN_SQL = """
+    SELECT 
+        id,
+        customer_name,
+        customer_email,
+        service_name,
+        starts_at,
+        status
+    FROM booknetic_appointments
+    WHERE starts_at >= %s
+      AND starts_at < %s
+      AND status NOT IN ('cancelled', 'rejected')
+    ORDER BY starts_at
+"""
+
+RECENT_CONVERSATIONS_SQL = """
+    SELECT 
+        id,
+        phone_number,
+        customer_name,
+        message_text,
+        response_text,
+        message_type,
+        created_at
+    FROM whatsapp_conversations
+    ORDER BY created_at DESC, id DESC
+    LIMIT %s
+"""
+
+# Keyset page: rows strictly older than the (created_at, id) of the previous page's last row
+RECENT_CONVERSATIONS_BEFORE_SQL = """
+    SELECT 
+        id,
+        phone_number,
+        customer_name,
+        message_text,
+        response_text,
+        message_type,
+        created_at
+    FROM whatsapp_conversations
+    WHERE (created_at, id) < (%s, %s)
+    ORDER BY created_at DESC, id DESC
+    LIMIT %s
+"""
+
+
+def _appointment_from_row(row: tuple) -> Dict:
+    return {
+        "id": row[0],
+        "customer_name": row[1],
+        "customer_email": row[2],
+        "service_name": row[3],
+        "starts_at": row[4].isoformat() if row[4] else None,
+        "status": row[5]
+    }
+
+
+def _conversation_from_row(row: tuple) -> Dict:
+    return {
+        "id": row[0],
+        "phone_number": row[1],
+        "customer_name": row[2],
+        "message_text": row[3],
+        "response_text": row[4],
+        "message_type": row[5],
+        "created_at": row[6].isoformat() if row[6] else None
+    }
+
 
 async def get_appointments_between_dates(
     start_date: datetime,
@@ -25,43 +105,35 @@ async def get_appointments_between_dates(
         List of appointments
     """
     try:
-        with get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT 
-                        id,
-                        customer_name,
-                        customer_email,
-                        service_name,
-                        starts_at,
-                        status
-                    FROM booknetic_appointments
-                    WHERE starts_at >= %s
-                      AND starts_at <= %s
-                      AND status NOT IN ('cancelled', 'rejected')
-                    ORDER BY starts_at
-                """, (start_date, end_date))
-                
-                results = cur.fetchall()
-                
-                appointments = []
-                for row in results:
-                    appointments.append({
-                        "id": row[0],
-                        "customer_name": row[1],
-                        "customer_email": row[2],
-                        "service_name": row[3],
-                        "starts_at": row[4].isoformat() if row[4] else None,
-                        "status": row[5]
-                    })
-                
-                return appointments
+        async with get_async_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(APPOINTMENTS_BETWEEN_SQL, (start_date, end_date), prepare=True)
+                results = await cur.fetchall()
+                return [_appointment_from_row(row) for row in results]
     
     except Exception as e:
         logger.error(f"Error querying appointments: {e}")
         return []
 
 
+async def _has_message_id_index(cur) -> bool:
+    """Whether the message_id unique index exists; a missing one is re-checked periodically."""
+    global _message_id_index_state
+    state = _message_id_index_state
+    if state is not None and (state[1] or time.monotonic() - state[0] < MESSAGE_ID_INDEX_RECHECK_SECONDS):
+        return state[1]
+    
+    await cur.execute("SELECT to_regclass(%s) IS NOT NULL", (MESSAGE_ID_INDEX,))
+    exists = (await cur.fetchone())[0]
+    if not exists:
+        logger.warning(
+            f"Index {MESSAGE_ID_INDEX} is missing; run run_migrations.py. "
+            "Saving conversations with a duplicate check per message until then."
+        )
+    _message_id_index_state = (time.monotonic(), exists)
+    return exists
+
+
 async def save_conversation(
     phone_number: str,
     customer_name: str,
@@ -84,24 +156,38 @@ async def save_conversation(
         direction: 'incoming' or 'outgoing'
     """
     try:
-        with get_connection() as conn:
-            with conn.cursor() as cur:
-                # Check if message already exists (by message_id if available)
-                if message_id:
-                    cur.execute("""
-                        SELECT id FROM whatsapp_conversations 
-                        WHERE message_id = %s
-                    """, (message_id,))
-                    if cur.fetchone():
-                        logger.info(f"Conversation with message_id {message_id} already exists, skipping")
-                        return
-                
-                cur.execute("""
-                    INSERT INTO whatsapp_conversations 
-                    (phone_number, customer_name, message_text, response_text, message_type, message_id, direction, created_at)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())
-                """, (phone_number, customer_name, message_text, response_text, message_type, message_id, direction))
-            conn.commit()
+        async with get_async_connection() as conn:
+            async with conn.cursor() as cur:
+                params = (phone_number, customer_name, message_text, response_text, message_type, message_id, direction)
+                if await _has_message_id_index(cur):
+                    # Duplicates (same message_id) are skipped by the unique index
+                    await cur.execute("""
+                        INSERT INTO whatsapp_conversations 
+                        (phone_number, customer_name, message_text, response_text, message_type, message_id, direction, created_at)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())
+                        ON CONFLICT (message_id) WHERE message_id IS NOT NULL DO NOTHING
+                        RETURNING id
+                    """, params, prepare=True)
+                    inserted = await cur.fetchone()
+                else:
+                    # Without the index, check if message already exists (by message_id if available)
+                    inserted = True
+                    if message_id:
+                        await cur.execute("""
+                            SELECT id FROM whatsapp_conversations 
+                            WHERE message_id = %s
+                        """, (message_id,), prepare=True)
+                        inserted = not await cur.fetchone()
+                    if inserted:
+                        await cur.execute("""
+                            INSERT INTO whatsapp_conversations 
+                            (phone_number, customer_name, message_text, response_text, message_type, message_id, direction, created_at)
+                            VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())
+                        """, params, prepare=True)
+            await conn.commit()
+            if not inserted:
+                logger.info(f"Conversation with message_id {message_id} already exists, skipping")
+                return
             logger.info(f"Conversation saved for {phone_number}")
     
     except Exception as e:
@@ -109,52 +195,198 @@ async def save_conversation(
         # Don't fail if we can't save - this is not critical
 
 
-async def get_recent_conversations(limit: int = 50) -> List[Dict]:
+# Column order of the rows passed to save_conversations_bulk
+CONVERSATION_BULK_COLUMNS = (
+    "phone_number",
+    "customer_name",
+    "message_text",
+    "response_text",
+    "message_type",
+    "direction",
+    "message_id",
+    "created_at",
+    "imported",
+)
+
+
+async def save_conversations_bulk(rows: Iterable[Sequence[Any]]) -> int:
+    """
+    Save many conversations in one round-trip, skipping duplicates
+    
+    Rows are streamed with COPY into a temporary table and then inserted
+    with ON CONFLICT DO NOTHING, so known message_ids are skipped just like
+    in save_conversation (or with an explicit NOT EXISTS check while the
+    unique index is missing). Meant for imports and backfills, not the webhook.
+    
+    Args:
+        rows: Tuples in CONVERSATION_BULK_COLUMNS order; a None created_at
+            becomes NOW()
+    
+    Returns:
+        Number of conversations inserted
+    """
+    columns = ", ".join(CONVERSATION_BULK_COLUMNS)
+    async with get_async_connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("""
+                CREATE TEMP TABLE whatsapp_conversations_import (
+                    phone_number VARCHAR(20),
+                    customer_name VARCHAR(100),
+                    message_text TEXT,
+                    response_text TEXT,
+                    message_type VARCHAR(20),
+                    direction VARCHAR(10),
+                    message_id VARCHAR(100),
+                    created_at TIMESTAMP,
+                    imported BOOLEAN
+                ) ON COMMIT DROP
+            """)
+            async with cur.copy(
+                f"COPY whatsapp_conversations_import ({columns}) FROM STDIN"
+            ) as copy:
+                for row in rows:
+                    await copy.write_row(row)
+            if await _has_message_id_index(cur):
+                await cur.execute(f"""
+                    INSERT INTO whatsapp_conversations ({columns})
+                    SELECT phone_number, customer_name, message_text, response_text,
+                           message_type, direction, message_id,
+                           COALESCE(created_at, NOW()), imported
+                    FROM whatsapp_conversations_import
+                    ON CONFLICT (message_id) WHERE message_id IS NOT NULL DO NOTHING
+                """)
+            else:
+                # Keep the first row per message_id and skip ids already stored
+                await cur.execute(f"""
+                    INSERT INTO whatsapp_conversations ({columns})
+                    SELECT phone_number, customer_name, message_text, response_text,
+                           message_type, direction, message_id,
+                           COALESCE(created_at, NOW()), imported
+                    FROM (
+                        SELECT *, row_number() OVER (PARTITION BY message_id) AS copy_number
+                        FROM whatsapp_conversations_import
+                    ) i
+                    WHERE i.message_id IS NULL
+                       OR (i.copy_number = 1 AND NOT EXISTS (
+                           SELECT 1 FROM whatsapp_conversations c
+                           WHERE c.message_id = i.message_id
+                       ))
+                """)
+            inserted = cur.rowcount
+        await conn.commit()
+    return inserted
+
+
+def conversation_cursor(conversation: Dict) -> Optional[str]:
+    """Opaque paging cursor pointing just past a conversation returned by get_recent_conversations"""
+    if not conversation.get("created_at"):
+        return None
+    return f"{conversation['created_at']}|{conversation['id']}"
+
+
+def _parse_conversation_cursor(cursor: str) -> tuple:
+    created_at, _, conversation_id = cursor.rpartition("|")
+    try:
+        return datetime.fromisoformat(created_at), int(conversation_id)
+    except ValueError:
+        raise ValueError(f"Invalid conversations cursor: {cursor}") from None
+
+
+async def get_recent_conversations(limit: int = 50, cursor: Optional[str] = None) -> List[Dict]:
     """
     Get recent conversations from database
     
     Args:
         limit: Maximum number of conversations to return
+        cursor: Optional cursor from conversation_cursor() to fetch the
+            page after that conversation (keyset pagination, no OFFSET)
     
     Returns:
         List of conversations
+    
+    Raises:
+        ValueError: If the cursor is malformed
     """
+    if cursor:
+        created_at, conversation_id = _parse_conversation_cursor(cursor)
+        query, params = RECENT_CONVERSATIONS_BEFORE_SQL, (created_at, conversation_id, limit)
+    else:
+        query, params = RECENT_CONVERSATIONS_SQL, (limit,)
+    
     try:
-        with get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT 
-                        id,
-                        phone_number,
-                        customer_name,
-                        message_text,
-                        response_text,
-                        message_type,
-                        created_at
-                    FROM whatsapp_conversations
-                    ORDER BY created_at DESC
-                    LIMIT %s
-                """, (limit,))
-                
-                results = cur.fetchall()
-                
-                conversations = []
-                for row in results:
-                    conversations.append({
-                        "id": row[0],
-                        "phone_number": row[1],
-                        "customer_name": row[2],
-                        "message_text": row[3],
-                        "response_text": row[4],
-                        "message_type": row[5],
-                        "created_at": row[6].isoformat() if row[6] else None
-                    })
-                
-                return conversations
+        async with get_async_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, params, prepare=True)
+                results = await cur.fetchall()
+                return [_conversation_from_row(row) for row in results]
     
     except Exception as e:
         logger.error(f"Error querying conversations: {e}")
         return []
 
 
+async def get_dashboard_snapshot(
+    conversations_limit: int,
+    start_date: datetime,
+    end_date: datetime
+) -> Dict[str, List[Dict]]:
+    """
+    Get recent conversations and upcoming appointments in one round-trip
+    
+    Both SELECTs are queued on a single connection in pipeline mode, so
+    the admin dashboard pays one network round-trip instead of two. Falls
+    back to running them back to back when libpq has no pipeline support.
+    
+    Args:
+        conversations_limit: Maximum number of conversations to return
+        start_date: Start date for appointments
+        end_date: End date for appointments
+    
+    Returns:
+        Dict with "conversations" and "appointments" lists
+    """
+    async with get_async_connection() as conn:
+        if AsyncPipeline.is_supported():
+            async with conn.pipeline():
+                conversations_cur = await conn.execute(
+                    RECENT_CONVERSATIONS_SQL, (conversations_limit,), prepare=True
+                )
+                appointments_cur = await conn.execute(
+                    APPOINTMENTS_BETWEEN_SQL, (start_date, end_date), prepare=True
+                )
+        else:
+            conversations_cur = await conn.execute(
+                RECENT_CONVERSATIONS_SQL, (conversations_limit,), prepare=True
+            )
+            appointments_cur = await conn.execute(
+                APPOINTMENTS_BETWEEN_SQL, (start_date, end_date), prepare=True
+            )
+
+        conversation_rows = await conversations_cur.fetchall()
+        appointment_rows = await appointments_cur.fetchall()
+
+    return {
+        "conversations": [_conversation_from_row(row) for row in conversation_rows],
+        "appointments": [_appointment_from_row(row) for row in appointment_rows],
+    }
+
 
+async def stream_recent_conversations(limit: int = 50) -> AsyncIterator[Dict]:
+    """
+    Yield recent conversations one by one from a server-side cursor
+    
+    Unlike get_recent_conversations, rows are fetched in batches and never
+    held in memory all at once, for large exports.
+    
+    Args:
+        limit: Maximum number of conversations to yield
+    
+    Yields:
+        Conversation dicts
+    """
+    async with get_async_connection() as conn:
+        async with conn.cursor(name="stream_recent_conversations") as cur:
+            cur.itersize = 500
+            await cur.execute(RECENT_CONVERSATIONS_SQL, (limit,))
+            async for row in cur:
+                yield _conversation_from_row(row)
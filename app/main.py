@@ -2,13 +2,20 @@
 FastAPI main application
 """
 from fastapi import FastAPI, Request, Response, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
+import json
 import logging
 
 from app.config import get_settings
-from app.whatsapp.webhook import handle_webhook, verify_webhook
+from app.whatsapp.webhook import handle_webhook, verify_webhook, drain_background_tasks
 from app.bot.conversation import ConversationManager
-from app.db.queries import get_recent_conversations, get_appointments_between_dates
+from app.db.queries import (
+    get_recent_conversations,
+    get_appointments_between_dates,
+    get_dashboard_snapshot,
+    stream_recent_conversations,
+    conversation_cursor
+)
 from app.db.leads import (
     get_or_create_lead, 
     update_lead_status, 
@@ -17,7 +24,8 @@ from app.db.leads import (
     import_conversation_batch
 )
 from app.db import business_data
-from datetime import datetime, timedelta
+from app.db.connection import close_async_pool
+from datetime import datetime, timedelta, timezone
 from pydantic import BaseModel
 from typing import List, Optional
 
@@ -28,11 +36,18 @@ logger = logging.getLogger(__name__)
 # Get settings
 settings = get_settings()
 
+try:
+    import orjson  # noqa: F401 - ORJSONResponse needs it at render time
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 # Create FastAPI app
 app = FastAPI(
     title="HotBoat WhatsApp Bot",
     description="Bot de WhatsApp para Hot Boat Chile",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse if ORJSON_AVAILABLE else JSONResponse
 )
 
 # Initialize conversation manager
@@ -41,15 +56,33 @@ conversation_manager = ConversationManager()
 # Mount MCP server if enabled
 if settings.embed_mcp_server:
     try:
-        from mcp_servers.openai_server import create_mcp_router
+        from mcp_servers.openai_server import (
+            SERVER_SECRET as MCP_SERVER_SECRET,
+            BearerAuthMiddleware,
+            close_http_client,
+            create_mcp_router,
+        )
         route_prefix = settings.openai_mcp_route_prefix or "/mcp"
         mcp_router = create_mcp_router()
         app.include_router(mcp_router, prefix=route_prefix)
+        app.add_middleware(
+            BearerAuthMiddleware,
+            secret=MCP_SERVER_SECRET,
+            protected_prefix=f"{route_prefix.rstrip('/')}/tools/"
+        )
+        app.add_event_handler("shutdown", close_http_client)
         logger.info(f"Embedded MCP server mounted at prefix {route_prefix}")
     except Exception as e:
         logger.error(f"Failed to mount MCP server: {e}")
 
 
+@app.on_event("shutdown")
+async def shutdown():
+    """Finish pending conversation writes and release pooled database connections"""
+    await drain_background_tasks()
+    await close_async_pool()
+
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -120,14 +153,40 @@ async def webhook_receive(request: Request):
         return JSONResponse(content={"status": "error", "message": str(e)}, status_code=200)
 
 
+STREAM_CONVERSATIONS_OVER = 100
+
+
+async def _conversations_ndjson(limit: int):
+    try:
+        async for conversation in stream_recent_conversations(limit):
+            yield json.dumps(conversation, ensure_ascii=False) + "\n"
+    except Exception as e:
+        logger.error(f"Error streaming conversations: {e}")
+        yield json.dumps({"error": str(e)}) + "\n"
+
+
 @app.get("/conversations")
-async def list_conversations(limit: int = 50):
-    """List recent conversations (for admin dashboard)"""
+async def list_conversations(limit: int = 50, cursor: Optional[str] = None):
+    """List recent conversations (for admin dashboard)
+
+    Pass the previous response's next_cursor as cursor to get the next page.
+    Large first-page requests (limit > STREAM_CONVERSATIONS_OVER) are
+    streamed as NDJSON, one conversation per line, instead of a JSON body.
+    """
+    if limit > STREAM_CONVERSATIONS_OVER and not cursor:
+        return StreamingResponse(
+            _conversations_ndjson(limit),
+            media_type="application/x-ndjson"
+        )
     try:
-        conversations = await get_recent_conversations(limit=limit)
+        conversations = await get_recent_conversations(limit=limit, cursor=cursor)
+        next_cursor = None
+        if conversations and len(conversations) == limit:
+            next_cursor = conversation_cursor(conversations[-1])
         return {
             "conversations": conversations,
-            "total": len(conversations)
+            "total": len(conversations),
+            "next_cursor": next_cursor
         }
     except Exception as e:
         logger.error(f"Error listing conversations: {e}")
@@ -142,7 +201,7 @@ async def list_conversations(limit: int = 50):
 async def list_appointments(days_ahead: int = 30):
     """List appointments for the next N days"""
     try:
-        start_date = datetime.now()
+        start_date = datetime.now(timezone.utc)
         end_date = start_date + timedelta(days=days_ahead)
         appointments = await get_appointments_between_dates(start_date, end_date)
         return {
@@ -160,6 +219,29 @@ async def list_appointments(days_ahead: int = 30):
         }
 
 
+
+@app.get("/dashboard")
+async def dashboard(limit: int = 50, days_ahead: int = 30):
+    """Recent conversations and upcoming appointments in a single call"""
+    start_date = datetime.now(timezone.utc)
+    end_date = start_date + timedelta(days=days_ahead)
+    try:
+        snapshot = await get_dashboard_snapshot(limit, start_date, end_date)
+        return {
+            "conversations": snapshot["conversations"],
+            "appointments": snapshot["appointments"],
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat()
+        }
+    except Exception as e:
+        logger.error(f"Error loading dashboard: {e}")
+        return {
+            "conversations": [],
+            "appointments": [],
+            "error": str(e)
+        }
+
+
 # Leads Management Endpoints
 
 @app.get("/leads")
@@ -271,11 +353,18 @@ async def list_database_views():
         }
 
 
+@app.post("/db/views/refresh")
+async def refresh_database_views():
+    """Forget cached view resolution after views are created or dropped"""
+    business_data.invalidate_views_cache()
+    return {"status": "refreshed"}
+
+
 @app.get("/db/views/{view_name}")
 async def query_view(view_name: str, limit: int = 50):
     """Query a specific database view"""
     try:
-        data = await business_data.get_custom_view_data(view_name, limit=limit)
+        data = await business_data.get_custom_view_data(view_name, limit=limit, cache=False)
         return {
             "view_name": view_name,
             "data": data,
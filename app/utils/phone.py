@@ -4,11 +4,19 @@ from typing import Final
 
 ALLOWED_PREFIXES: Final[tuple[str, ...]] = ("00",)
 
+# Deletes every ASCII character that isn't 0-9; used for the common ASCII-only input.
+_ASCII_NON_DIGITS: Final[dict[int, None]] = str.maketrans(
+    "", "", "".join(chr(c) for c in range(128) if not chr(c).isdigit())
+)
+
 
 def normalize_phone_number(raw_number: str) -> str:
     """Remove non-digit characters and strip known international prefixes."""
 
-    digits = "".join(ch for ch in raw_number if ch.isdigit())
+    if raw_number.isascii():
+        digits = raw_number.translate(_ASCII_NON_DIGITS)
+    else:
+        digits = "".join(ch for ch in raw_number if ch.isdigit())
 
     for prefix in ALLOWED_PREFIXES:
         if digits.startswith(prefix):
@@ -16,7 +24,3 @@ def normalize_phone_number(raw_number: str) -> str:
             break
 
     return digits
-
-
-
-
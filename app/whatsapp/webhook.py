@@ -1,14 +1,44 @@
 """
 WhatsApp webhook handler
 """
+import asyncio
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Set
 
 from app.whatsapp.client import whatsapp_client
 from app.db.queries import save_conversation
 
 logger = logging.getLogger(__name__)
 
+# Strong references to in-flight background writes (the event loop only keeps weak ones)
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def _on_background_task_done(task: asyncio.Task) -> None:
+    _background_tasks.discard(task)
+    if task.cancelled():
+        return
+    error = task.exception()
+    if error:
+        logger.warning(f"Background task {task.get_name()} failed: {error}")
+
+
+def _spawn_background(coro, name: str) -> asyncio.Task:
+    """Run a coroutine off the webhook's critical path, logging any failure"""
+    task = asyncio.create_task(coro, name=name)
+    _background_tasks.add(task)
+    task.add_done_callback(_on_background_task_done)
+    return task
+
+
+async def drain_background_tasks(timeout: float = 10.0) -> None:
+    """Wait for pending background writes, e.g. before shutdown"""
+    if not _background_tasks:
+        return
+    _, pending = await asyncio.wait(set(_background_tasks), timeout=timeout)
+    if pending:
+        logger.warning(f"{len(pending)} background tasks still pending at shutdown")
+
 
 def verify_webhook(mode: Optional[str], token: Optional[str], expected_token: str) -> bool:
     """
@@ -112,9 +142,9 @@ async def process_message(message: Dict[str, Any], value: Dict[str, Any], conver
             if response:
                 await whatsapp_client.send_text_message(from_number, response)
                 
-                # Save conversation to database
-                try:
-                    await save_conversation(
+                # Save conversation to database without holding up the webhook ack
+                _spawn_background(
+                    save_conversation(
                         phone_number=from_number,
                         customer_name=contact_name,
                         message_text=text_body,
@@ -122,9 +152,9 @@ async def process_message(message: Dict[str, Any], value: Dict[str, Any], conver
                         message_type=message_type,
                         message_id=message_id,
                         direction="incoming"
-                    )
-                except Exception as e:
-                    logger.warning(f"Could not save conversation: {e}")
+                    ),
+                    name=f"save_conversation:{message_id}"
+                )
         
         elif message_type == "interactive":
             # Handle button/list responses
@@ -21,6 +21,15 @@ ADD COLUMN IF NOT EXISTS message_id VARCHAR(100),
 ADD COLUMN IF NOT EXISTS direction VARCHAR(10) DEFAULT 'incoming', -- 'incoming' or 'outgoing'
 ADD COLUMN IF NOT EXISTS imported BOOLEAN DEFAULT FALSE; -- True if imported from old conversations
 
--- Create index for message_id
-CREATE INDEX IF NOT EXISTS idx_message_id ON whatsapp_conversations(message_id);
+-- Remove duplicate message_ids (keep the first copy) so the unique index can be built
+DELETE FROM whatsapp_conversations a
+USING whatsapp_conversations b
+WHERE a.message_id IS NOT NULL
+  AND a.message_id = b.message_id
+  AND a.id > b.id;
+
+-- Unique index for message_id; lets inserts use ON CONFLICT instead of a lookup first
+DROP INDEX IF EXISTS idx_message_id;
+CREATE UNIQUE INDEX IF NOT EXISTS whatsapp_conversations_message_id_uk
+ON whatsapp_conversations(message_id) WHERE message_id IS NOT NULL;
 
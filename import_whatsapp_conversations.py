@@ -157,6 +157,15 @@ async def import_from_csv(file_path: str):
         traceback.print_exc()
 
 
+async def run_import(import_coro):
+    """Run an import and close the async DB pool before the event loop shuts down"""
+    try:
+        await import_coro
+    finally:
+        from app.db.connection import close_async_pool
+        await close_async_pool()
+
+
 async def create_sample_import_template():
     """Create a sample JSON template for importing conversations"""
     sample = [
@@ -219,9 +228,9 @@ if __name__ == "__main__":
             sys.exit(1)
     
     if file_type == 'json':
-        asyncio.run(import_from_json(file_path))
+        asyncio.run(run_import(import_from_json(file_path)))
     elif file_type == 'csv':
-        asyncio.run(import_from_csv(file_path))
+        asyncio.run(run_import(import_from_csv(file_path)))
     else:
         print(f"❌ Unknown file type: {file_type}")
         sys.exit(1)
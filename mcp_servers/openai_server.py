@@ -10,13 +10,24 @@ ocurre dentro del servidor MCP.
 
 from __future__ import annotations
 
+import hashlib
+import hmac
+import json
 import logging
 import os
+import time
+from collections import OrderedDict
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Literal, Optional
-
-from fastapi import APIRouter, Depends, FastAPI, HTTPException, Request, status
-from anthropic import Anthropic, NotFoundError
+from typing import Any, Dict, List, Literal, Optional, Tuple
+
+from fastapi import APIRouter, FastAPI, HTTPException, status
+from anthropic import (
+    DEFAULT_CONNECTION_LIMITS,
+    DEFAULT_TIMEOUT,
+    AsyncAnthropic,
+    DefaultAsyncHttpxClient,
+    NotFoundError,
+)
 from pydantic import BaseModel, Field
 
 from app.bot.context_builder import build_business_context
@@ -60,6 +71,11 @@ SERVER_SECRET = os.getenv("OPENAI_MCP_SERVER_KEY")
 SERVER_HOST = os.getenv("OPENAI_MCP_HOST", "0.0.0.0")
 SERVER_PORT = _env_int("OPENAI_MCP_PORT", 9000)
 SERVER_RELOAD = os.getenv("OPENAI_MCP_RELOAD", "false").lower() == "true"
+HTTP_TIMEOUT = _env_float("ANTHROPIC_MCP_TIMEOUT", 120.0)
+HTTP_MAX_CONNECTIONS = _env_int("ANTHROPIC_MCP_MAX_CONNECTIONS", 500)
+HTTP_MAX_KEEPALIVE = _env_int("ANTHROPIC_MCP_MAX_KEEPALIVE", 200)
+BUSINESS_CONTEXT_TTL = _env_float("BUSINESS_CONTEXT_TTL", 60.0)
+BUSINESS_CONTEXT_CACHE_SIZE = _env_int("BUSINESS_CONTEXT_CACHE_SIZE", 2048)
 
 def _build_client_kwargs() -> Dict[str, Any]:
     kwargs: Dict[str, Any] = {"api_key": ANTHROPIC_API_KEY}
@@ -71,20 +87,39 @@ def _build_client_kwargs() -> Dict[str, Any]:
     return kwargs
 
 
+_CLIENT_KWARGS: Dict[str, Any] = _build_client_kwargs()
+
+def _build_client() -> AsyncAnthropic:
+    """
+    Anthropic client on a pooled HTTP client, so concurrent requests reuse
+    keep-alive connections. DefaultAsyncHttpxClient, and Limits/Timeout
+    built from the SDK's own defaults, always match the HTTP library the
+    installed SDK was built on.
+    """
+    http_client = DefaultAsyncHttpxClient(
+        limits=type(DEFAULT_CONNECTION_LIMITS)(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        ),
+        timeout=type(DEFAULT_TIMEOUT)(HTTP_TIMEOUT),
+    )
+    return AsyncAnthropic(http_client=http_client, **_CLIENT_KWARGS)
+
+
 # Initialize Anthropic client
-_client: Optional[Anthropic] = None
+_client: Optional[AsyncAnthropic] = None
 if ANTHROPIC_API_KEY:
-    _client = Anthropic(**_build_client_kwargs())
+    _client = _build_client()
 
 
-def _candidate_models() -> List[str]:
-    seen = set()
-    ordered: List[str] = []
-    for model in [ANTHROPIC_MODEL, *ANTHROPIC_MODEL_FALLBACKS, DEFAULT_SAFE_MODEL]:
-        if model and model not in seen:
-            seen.add(model)
-            ordered.append(model)
-    return ordered
+# Configured model first, then fallbacks, then the safe default; deduplicated in order
+_CANDIDATE_MODELS: tuple[str, ...] = tuple(
+    dict.fromkeys(
+        model
+        for model in (ANTHROPIC_MODEL, *ANTHROPIC_MODEL_FALLBACKS, DEFAULT_SAFE_MODEL)
+        if model
+    )
+)
 
 class ConversationMessage(BaseModel):
     role: Literal["system", "user", "assistant"]
@@ -133,29 +168,61 @@ class ToolResponse(BaseModel):
     created_at: datetime
 
 
-async def verify_authorization(request: Request) -> None:
+class BearerAuthMiddleware:
     """
     Simple bearer-token auth to keep the MCP endpoint private.
-    """
-    if not SERVER_SECRET:
-        return
-
-    header = request.headers.get("Authorization")
-    if not header or not header.startswith("Bearer "):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Missing Authorization header",
-        )
 
-    token = header.split(" ", 1)[1].strip()
-    if token != SERVER_SECRET:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid API token",
-        )
+    Pure ASGI: the Authorization header is checked straight from the scope
+    before routing, without building a Request or running dependencies.
+    """
 
+    def __init__(self, app, secret: Optional[str], protected_prefix: str = "/tools/") -> None:
+        self.app = app
+        self.secret = secret.encode() if secret else None
+        self.protected_prefix = protected_prefix
+
+    async def __call__(self, scope, receive, send) -> None:
+        if (
+            self.secret is None
+            or scope["type"] != "http"
+            or not scope["path"].startswith(self.protected_prefix)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        header = None
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                header = value
+                break
 
-def _ensure_client() -> Anthropic:
+        if not header or not header.startswith(b"Bearer "):
+            await self._reject(send, "Missing Authorization header")
+            return
+
+        token = header[len(b"Bearer "):].strip()
+        if not hmac.compare_digest(token, self.secret):
+            await self._reject(send, "Invalid API token")
+            return
+
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    async def _reject(send, detail: str) -> None:
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status.HTTP_401_UNAUTHORIZED,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"www-authenticate", b"Bearer"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def _ensure_client() -> AsyncAnthropic:
     global _client
     if _client is None:
         if not ANTHROPIC_API_KEY:
@@ -163,10 +230,26 @@ def _ensure_client() -> Anthropic:
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="ANTHROPIC_API_KEY is not configured.",
             )
-        _client = Anthropic(**_build_client_kwargs())
+        _client = _build_client()
     return _client
 
 
+async def close_http_client() -> None:
+    """Close the pooled connections used for Claude calls."""
+    if _client is not None:
+        await _client.close()
+
+
+# (message digest, phone) -> (expires_at, context); repeated questions skip the database
+_context_cache: "OrderedDict[Tuple[str, str], Tuple[float, Optional[str]]]" = OrderedDict()
+
+
+def _context_cache_key(message: str, phone_number: Optional[str]) -> Tuple[str, str]:
+    normalized = message.strip().lower()
+    digest = hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).hexdigest()
+    return digest, phone_number or ""
+
+
 async def _resolve_business_context(args: ToolArguments) -> Optional[str]:
     if args.business_context:
         return args.business_context
@@ -174,14 +257,29 @@ async def _resolve_business_context(args: ToolArguments) -> Optional[str]:
     if not args.message_text:
         return None
     
+    key = _context_cache_key(args.message_text, args.phone_number)
+    entry = _context_cache.get(key)
+    if entry is not None:
+        expires_at, context = entry
+        if expires_at > time.monotonic():
+            _context_cache.move_to_end(key)
+            return context
+        del _context_cache[key]
+    
     try:
         context = await build_business_context(args.message_text, args.phone_number)
         if context:
             logger.info("Business context built directly from database via MCP.")
-        return context
     except Exception as exc:
         logger.error("Failed to build business context inside MCP: %s", exc)
         return None
+    
+    if BUSINESS_CONTEXT_TTL > 0:
+        _context_cache[key] = (time.monotonic() + BUSINESS_CONTEXT_TTL, context)
+        _context_cache.move_to_end(key)
+        while len(_context_cache) > BUSINESS_CONTEXT_CACHE_SIZE:
+            _context_cache.popitem(last=False)
+    return context
 
 
 def _get_database_schema() -> str:
@@ -365,9 +463,7 @@ def create_router(prefix: str = "") -> APIRouter:
         }
 
     @router.post(f"/tools/{TOOL_NAME}", response_model=ToolResponse)
-    async def invoke_openai_tool(
-        payload: ToolInvocation, _: None = Depends(verify_authorization)
-    ) -> ToolResponse:
+    async def invoke_openai_tool(payload: ToolInvocation) -> ToolResponse:
         args = payload.arguments
         context_data = await _resolve_business_context(args)
         system_prompt, messages = _build_messages_for_claude(args, context_data)
@@ -388,9 +484,9 @@ def create_router(prefix: str = "") -> APIRouter:
         used_model: Optional[str] = None
         last_error: Optional[Exception] = None
 
-        for model_name in _candidate_models():
+        for model_name in _CANDIDATE_MODELS:
             try:
-                response = client.messages.create(
+                response = await client.messages.create(
                     model=model_name,
                     system=system_prompt,
                     messages=messages,
@@ -468,6 +564,8 @@ def create_app() -> FastAPI:
         description="Bridge between MCP tool calls and OpenAI Chat Completions.",
     )
     fastapi_app.include_router(create_router())
+    fastapi_app.add_middleware(BearerAuthMiddleware, secret=SERVER_SECRET)
+    fastapi_app.add_event_handler("shutdown", close_http_client)
     return fastapi_app
 
 
@@ -476,13 +574,24 @@ app = create_app()
 
 def run() -> None:
     """Convenience entrypoint for `python -m mcp_servers.openai_server`."""
+    import importlib.util
+
     import uvicorn
 
+    # Both ship with uvicorn[standard] (not on Windows); fall back to uvicorn's defaults otherwise
+    server_options: Dict[str, Any] = {}
+    if importlib.util.find_spec("uvloop"):
+        server_options["loop"] = "uvloop"
+    if importlib.util.find_spec("httptools"):
+        server_options["http"] = "httptools"
+
     uvicorn.run(
         "mcp_servers.openai_server:app",
         host=SERVER_HOST,
         port=SERVER_PORT,
         reload=SERVER_RELOAD,
+        interface="asgi3",
+        **server_options,
     )
 
 
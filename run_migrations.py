@@ -82,10 +82,6 @@ def run_migrations():
                     CREATE INDEX IF NOT EXISTS idx_created_at ON whatsapp_conversations(created_at DESC);
                 """)
                 
-                cur.execute("""
-                    CREATE INDEX IF NOT EXISTS idx_message_id ON whatsapp_conversations(message_id);
-                """)
-                
                 # Add columns if they don't exist (for existing tables)
                 cur.execute("""
                     DO $$ 
@@ -116,9 +112,25 @@ def run_migrations():
                     END $$;
                 """)
                 
-                # Create index for message_id
+                # Remove duplicate message_ids (keep the first copy) before the unique index
+                cur.execute("""
+                    DELETE FROM whatsapp_conversations a
+                    USING whatsapp_conversations b
+                    WHERE a.message_id IS NOT NULL
+                      AND a.message_id = b.message_id
+                      AND a.id > b.id;
+                """)
+                if cur.rowcount:
+                    print(f"   • Removed {cur.rowcount} duplicate conversation rows")
+                
+                # Unique index for message_id (save_conversation relies on it for ON CONFLICT)
+                cur.execute("""
+                    DROP INDEX IF EXISTS idx_message_id;
+                """)
+                
                 cur.execute("""
-                    CREATE INDEX IF NOT EXISTS idx_message_id ON whatsapp_conversations(message_id);
+                    CREATE UNIQUE INDEX IF NOT EXISTS whatsapp_conversations_message_id_uk
+                    ON whatsapp_conversations(message_id) WHERE message_id IS NOT NULL;
                 """)
                 
                 conn.commit()
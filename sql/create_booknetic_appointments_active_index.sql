@@ -0,0 +1,7 @@
+-- Partial index for upcoming active appointments (GET /appointments, /dashboard)
+-- Matches the WHERE clause of APPOINTMENTS_BETWEEN_SQL in app/db/queries.py.
+-- CONCURRENTLY avoids locking the table; run it outside a transaction block.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS booknetic_appt_starts_active
+ON public.booknetic_appointments (starts_at)
+WHERE status NOT IN ('cancelled', 'rejected');